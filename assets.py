@@ -0,0 +1,115 @@
+"""Indlæsning af billeder og lyde i baggrunden med en cache på disken.
+
+AssetLoader dekoder filerne i en baggrundstråd, mens spillet kører med
+pladsholdere (ensfarvet baggrund, ingen lyd). Færdige assets hentes i
+hovedtråden med poll(). AssetCache gemmer det allerede skalerede
+baggrundsbillede og de dekodede PCM-lydbuffere, nøglet på kildefilens
+størrelse og mtime, så senere opstarter springer dekodningen over.
+
+pygame importeres først af indlæsningsfunktionerne og tråde og køer først af
+AssetLoader, så AssetCache (som også holder kompilerede bordfiler) kan bruges
+i et headless spil uden pygame og uden threading.
+"""
+import os
+import struct
+
+ASSET_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "pinball")
+ASSET_CACHE_VERSION = 1
+_IMAGE_HEADER = struct.Struct("<II") # Bredde, højde; derefter RGB-bytes
+
+
+class AssetCache:
+    def __init__(self, directory=ASSET_CACHE_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, source, params):
+        # Nøglen ændres når kildefilen ændres, eller når dekodningen ville give et andet resultat
+        import hashlib
+        stat = os.stat(source)
+        key = f"{ASSET_CACHE_VERSION}|{os.path.abspath(source)}|{stat.st_size}|{stat.st_mtime_ns}|{params}"
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + ".bin")
+
+    def get(self, source, params):
+        try:
+            with open(self.path(source, params), "rb") as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, source, params, data):
+        # Skrives til en midlertidig fil og omdøbes, så en afbrudt skrivning ikke efterlader en halv fil
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path(source, params)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Kunne ikke skrive asset-cache: {e}")
+
+
+def load_scaled_image(path, size, cache=None):
+    # Returnerer en ukonverteret surface; convert() skal kaldes i hovedtråden
+    import pygame
+    params = f"image|{size[0]}x{size[1]}"
+    data = cache.get(path, params) if cache else None
+    if data is not None and len(data) >= _IMAGE_HEADER.size:
+        width, height = _IMAGE_HEADER.unpack_from(data)
+        if (width, height) == tuple(size) and len(data) == _IMAGE_HEADER.size + width * height * 3:
+            return pygame.image.frombytes(data[_IMAGE_HEADER.size:], (width, height), "RGB")
+
+    image = pygame.transform.scale(pygame.image.load(path), size)
+    if cache:
+        cache.put(path, params, _IMAGE_HEADER.pack(*size) + pygame.image.tobytes(image, "RGB"))
+    return image
+
+
+def load_sound(path, cache=None):
+    # PCM-bufferen afhænger af mixerens frekvens, format og kanaler
+    import pygame
+    params = f"sound|{pygame.mixer.get_init()}"
+    data = cache.get(path, params) if cache else None
+    if data:
+        return pygame.mixer.Sound(buffer=data)
+
+    sound = pygame.mixer.Sound(path)
+    if cache:
+        cache.put(path, params, sound.get_raw())
+    return sound
+
+
+class AssetLoader:
+    # Kører indlæsningsjobs i én baggrundstråd. Hvert job er (navn, funktion, argumenter),
+    # og resultatet kommer ud af poll() som (navn, værdi, fejl) i den rækkefølge jobbene blev lagt ind.
+    def __init__(self):
+        import queue
+        self.results = queue.Queue()
+        self.thread = None
+
+    def start(self, jobs):
+        import threading
+        self.thread = threading.Thread(target=self._run, args=(list(jobs),), name="asset-loader", daemon=True)
+        self.thread.start()
+
+    def _run(self, jobs):
+        import pygame
+        for name, load, args in jobs:
+            try:
+                self.results.put((name, load(*args), None))
+            except (pygame.error, OSError) as e:
+                self.results.put((name, None, e))
+
+    def poll(self):
+        # Kun hovedtråden henter fra køen, så empty() kan ikke snyde her
+        while not self.results.empty():
+            yield self.results.get_nowait()
+
+    def wait(self):
+        if self.thread:
+            self.thread.join()
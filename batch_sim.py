@@ -0,0 +1,468 @@
+"""Headless, vektoriseret batch-simulator til pinball.py.
+
+Holder kugle-, flipper- og samleobjekt-tilstand for N uafhængige spil som
+NumPy-arrays og udfører et helt `PinballGame.update` for alle spil i ét
+vektoriseret skridt. Regneoperationerne er de samme (og i samme rækkefølge)
+som i den skalare kode, så samme seed giver samme score og samme tabte kugler.
+Simulatoren spejler den diskrete kollisionssti med én kugle, dvs. PinballGame
+med continuous_collision = False og multiball_balls = 0, inklusive
+hviledetektoren: sovende kugler står stille og springer kollisionerne over.
+
+Eksempel:
+    python batch_sim.py --games 8192 --frames 600
+    python batch_sim.py --verify
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+import pinball
+from assets import AssetCache
+from table import TABLE_FIELDS, load_table
+from pinball import (
+    SCREEN_WIDTH, SCREEN_HEIGHT, BALL_RADIUS, FLIPPER_LENGTH, FLIPPER_WIDTH,
+    WALL_THICKNESS, COLLECTIBLE_RADIUS, COLLECTIBLE_POINTS, COLLECTIBLE_MAX_COUNT,
+    SLEEP_DISTANCE, SLEEP_AFTER, SLEEP_RESPAWN_AFTER,
+)
+
+
+class BatchSimulator:
+    def __init__(self, num_games, seeds=None, table=pinball.DEFAULT_TABLE):
+        self.num_games = num_games
+        n = num_games
+
+        # Væggene er statiske og deles af alle spil. Arrays læses direkte fra den
+        # kompilerede bordfil (samme forudberegnede tal som pinball.wall_collision bruger)
+        self.table = load_table(table, AssetCache())
+        columns = {field: np.frombuffer(getattr(self.table, field), dtype=np.float64) for field in TABLE_FIELDS}
+        self.walls = list(zip(*(columns[field].tolist() for field in ("x1", "y1", "wx", "wy", "inv_length_sq", "normal_x", "normal_y"))))
+        margin = BALL_RADIUS + WALL_THICKNESS / 2 + 1
+        self._wall_min_x = columns["min_x"] - margin
+        self._wall_max_x = columns["max_x"] + margin
+        self._wall_min_y = columns["min_y"] - margin
+        self._wall_max_y = columns["max_y"] + margin
+
+        # Flippere: kolonne 0 = venstre, kolonne 1 = højre (samme som reset_game)
+        self.flipper_pivot_x = np.array([SCREEN_WIDTH // 2 - 100, SCREEN_WIDTH // 2 + 100], dtype=np.float64)
+        self.flipper_pivot_y = np.array([SCREEN_HEIGHT - 120, SCREEN_HEIGHT - 120], dtype=np.float64)
+        self.flipper_rest_angle = np.array([45.0, 135.0])
+        self.flipper_active_angle = np.array([-15.0, 195.0])
+
+        self.ball_x = np.zeros(n)
+        self.ball_y = np.zeros(n)
+        self.ball_vx = np.zeros(n)
+        self.ball_vy = np.zeros(n)
+        self.ball_asleep = np.zeros(n, dtype=bool)
+        self.ball_rest_x = np.zeros(n)
+        self.ball_rest_y = np.zeros(n)
+        self.ball_rest_time = np.zeros(n)
+        self.ball_sleep_time = np.zeros(n)
+        self.flipper_angle = np.zeros((n, 2))
+        self.flipper_prev_angle = np.zeros((n, 2))
+        self.flipper_angular_velocity = np.zeros((n, 2))
+        self.flipper_target = np.zeros((n, 2))
+        self.flipper_active = np.zeros((n, 2), dtype=bool)
+
+        self.collectible_x = np.zeros((n, COLLECTIBLE_MAX_COUNT))
+        self.collectible_y = np.zeros((n, COLLECTIBLE_MAX_COUNT))
+        self.collectible_alive = np.zeros((n, COLLECTIBLE_MAX_COUNT), dtype=bool)
+
+        self.score = np.zeros(n, dtype=np.int64)
+        self.balls_left = np.zeros(n, dtype=np.int64)
+        self.last_extra_ball_score_threshold = np.zeros(n, dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.balls_lost = np.zeros(n, dtype=np.int64)
+        self.stuck_respawns = np.zeros(n, dtype=np.int64)
+        self.frames = 0
+
+        self.rngs = [None] * n
+        self.reset(seeds)
+
+    # --- Tilstand (spejler PinballGame.reset_game / _spawn_new_ball / create_collectibles) ---
+
+    def reset(self, seeds=None, indices=None):
+        if indices is None:
+            indices = range(self.num_games)
+        for i in indices:
+            seed = seeds[i] if seeds is not None else None
+            self.rngs[i] = random.Random(seed)
+            self.score[i] = 0
+            self.balls_left[i] = 5
+            self.last_extra_ball_score_threshold[i] = 0
+            self.game_over[i] = False
+            self.balls_lost[i] = 0
+            self.stuck_respawns[i] = 0
+            self._spawn_new_ball(i)
+            self.flipper_angle[i] = self.flipper_rest_angle
+            self.flipper_prev_angle[i] = self.flipper_rest_angle
+            self.flipper_angular_velocity[i] = 0.0
+            self.flipper_target[i] = self.flipper_rest_angle
+            self.flipper_active[i] = False
+            self._create_collectibles(i)
+
+    def _spawn_new_ball(self, i):
+        rng = self.rngs[i]
+        self.ball_x[i] = rng.randint(SCREEN_WIDTH // 2 - 50, SCREEN_WIDTH // 2 + 50)
+        self.ball_y[i] = 175
+        self.ball_vx[i] = rng.uniform(-2, 2)
+        self.ball_vy[i] = 0
+        self.ball_asleep[i] = False
+        self.ball_rest_x[i] = self.ball_x[i]
+        self.ball_rest_y[i] = self.ball_y[i]
+        self.ball_rest_time[i] = 0.0
+        self.ball_sleep_time[i] = 0.0
+
+    def _create_collectibles(self, i):
+        rng = self.rngs[i]
+        count = rng.randint(5, COLLECTIBLE_MAX_COUNT)
+        self.collectible_alive[i] = False
+        for k in range(count):
+            self.collectible_x[i, k] = rng.randint(200, SCREEN_WIDTH - 200)
+            self.collectible_y[i, k] = rng.randint(150, SCREEN_HEIGHT - 350)
+            self.collectible_alive[i, k] = True
+
+    # --- Fysik ---
+
+    def step(self, left=None, right=None):
+        """Kør ét frame for alle spil. Returnerer et bool-array med spil der tabte en kugle."""
+        frozen = np.flatnonzero(self.game_over)
+        if frozen.size:
+            # Som i PinballGame.update: spil der er slut står stille
+            saved = (self.ball_x[frozen], self.ball_y[frozen], self.ball_vx[frozen], self.ball_vy[frozen],
+                     self.flipper_angle[frozen], self.flipper_target[frozen], self.flipper_active[frozen],
+                     self.flipper_prev_angle[frozen], self.flipper_angular_velocity[frozen])
+
+        if left is not None:
+            self.flipper_active[:, 0] = left
+        if right is not None:
+            self.flipper_active[:, 1] = right
+        self.flipper_target = np.where(self.flipper_active, self.flipper_active_angle, self.flipper_rest_angle)
+
+        # Sovende kugler integreres ikke: deres tilstand gemmes og lægges tilbage efter _update_balls
+        asleep = np.flatnonzero(self.ball_asleep)
+        if asleep.size:
+            sleeping = (self.ball_x[asleep], self.ball_y[asleep], self.ball_vx[asleep], self.ball_vy[asleep])
+            self.ball_sleep_time[asleep] += 1.0
+        self._update_balls()
+        self._update_flippers()
+        if asleep.size:
+            self.ball_x[asleep], self.ball_y[asleep], self.ball_vx[asleep], self.ball_vy[asleep] = sleeping
+            self._wake_balls(asleep)
+
+        self._awake = ~self.ball_asleep
+        self._collide_walls()
+        self._collide_flipper(0)
+        self._collide_flipper(1)
+        self._collide_collectibles()
+
+        if frozen.size:
+            (self.ball_x[frozen], self.ball_y[frozen], self.ball_vx[frozen], self.ball_vy[frozen],
+             self.flipper_angle[frozen], self.flipper_target[frozen], self.flipper_active[frozen],
+             self.flipper_prev_angle[frozen], self.flipper_angular_velocity[frozen]) = saved
+
+        live = ~self.game_over
+        self._track_rest(live & self._awake)
+        if asleep.size:
+            stuck = live & self.ball_asleep & (self.ball_sleep_time >= SLEEP_RESPAWN_AFTER)
+            self.stuck_respawns += stuck
+            for i in np.flatnonzero(stuck):
+                self._spawn_new_ball(i)
+
+        # Ekstrabold for hver 500 point
+        extra = live & (self.score >= self.last_extra_ball_score_threshold + 500)
+        self.balls_left += extra
+        self.last_extra_ball_score_threshold += 500 * extra
+
+        lost = live & (self.ball_y > SCREEN_HEIGHT + 50)
+        if lost.any():
+            self.balls_left -= lost
+            self.balls_lost += lost
+            self.game_over |= lost & (self.balls_left <= 0)
+            for i in np.flatnonzero(lost & ~self.game_over):
+                self._spawn_new_ball(i)
+
+        self.frames += 1
+        return lost
+
+    def _update_balls(self):
+        # Ball.update. Fysikkonstanterne læses fra pinball ved hvert skridt, så
+        # justeringer (fx fra tuner.py) gælder begge stier.
+        self.ball_vy += pinball.GRAVITY
+        self.ball_x += self.ball_vx
+        self.ball_y += self.ball_vy
+
+        r = BALL_RADIUS
+        hit_left = self.ball_x - r <= 0
+        hit_right = ~hit_left & (self.ball_x + r >= SCREEN_WIDTH)
+        self.ball_x[hit_left] = r
+        self.ball_vx[hit_left] = np.abs(self.ball_vx[hit_left]) * pinball.WALL_RESTITUTION
+        self.ball_x[hit_right] = SCREEN_WIDTH - r
+        self.ball_vx[hit_right] = -np.abs(self.ball_vx[hit_right]) * pinball.WALL_RESTITUTION
+
+        hit_top = self.ball_y - r <= 0
+        self.ball_y[hit_top] = r
+        self.ball_vy[hit_top] = np.abs(self.ball_vy[hit_top]) * pinball.WALL_RESTITUTION
+
+        self.ball_vx *= pinball.BALL_DAMPING
+        self.ball_vy *= pinball.BALL_DAMPING
+
+    def _wake_balls(self, asleep):
+        # PinballGame._wake_balls: en flipper der har bevæget sig vækker kugler inden for rækkevidde
+        reach = FLIPPER_LENGTH + BALL_RADIUS + FLIPPER_WIDTH
+        x = self.ball_x[asleep, None]
+        y = self.ball_y[asleep, None]
+        dx = x - self.flipper_pivot_x
+        dy = y - self.flipper_pivot_y
+        moved = self.flipper_angle[asleep] != self.flipper_prev_angle[asleep]
+        woken = asleep[(moved & (dx * dx + dy * dy <= reach * reach)).any(axis=1)]
+        self.ball_asleep[woken] = False
+        self.ball_rest_x[woken] = self.ball_x[woken]
+        self.ball_rest_y[woken] = self.ball_y[woken]
+        self.ball_rest_time[woken] = 0.0
+
+    def _track_rest(self, mask):
+        # Ball.track_rest for de vågne kugler i mask. En kugle inden for rækkevidde af en løftet
+        # flipper (PinballGame._near_active_flipper) tæller som i bevægelse, ligesom wake()
+        reach = FLIPPER_LENGTH + BALL_RADIUS + FLIPPER_WIDTH
+        px = self.ball_x[:, None] - self.flipper_pivot_x
+        py = self.ball_y[:, None] - self.flipper_pivot_y
+        cradled = (self.flipper_active & (px * px + py * py <= reach * reach)).any(axis=1)
+        dx = self.ball_x - self.ball_rest_x
+        dy = self.ball_y - self.ball_rest_y
+        moved = mask & (cradled | (dx * dx + dy * dy > SLEEP_DISTANCE * SLEEP_DISTANCE))
+        resting = mask & ~moved
+        self.ball_rest_x[moved] = self.ball_x[moved]
+        self.ball_rest_y[moved] = self.ball_y[moved]
+        self.ball_rest_time[moved] = 0.0
+        self.ball_rest_time[resting] += 1.0
+        sleep = resting & (self.ball_rest_time >= SLEEP_AFTER)
+        if sleep.any():
+            self.ball_asleep |= sleep
+            self.ball_sleep_time[sleep] = 0.0
+            self.ball_vx[sleep] = 0.0
+            self.ball_vy[sleep] = 0.0
+
+    def _update_flippers(self):
+        # Flipper.update
+        self.flipper_prev_angle = self.flipper_angle
+        prev_rad = np.radians(self.flipper_prev_angle)
+        self._flipper_prev_cos = np.cos(prev_rad)
+        self._flipper_prev_sin = np.sin(prev_rad)
+        angle_diff = self.flipper_target - self.flipper_angle
+        self.flipper_angle = np.where(np.abs(angle_diff) > 0.5, self.flipper_angle + angle_diff * pinball.FLIPPER_SWING, self.flipper_target)
+        self.flipper_angular_velocity = np.radians(self.flipper_angle - self.flipper_prev_angle)
+
+    def _collide_walls(self):
+        threshold = BALL_RADIUS + WALL_THICKNESS / 2
+
+        # Broadphase: kun spil hvor kuglen ligger i mindst én vægs udvidede bounding box
+        # kan ramme noget, og kun de spil køres sekventielt væg for væg.
+        x = self.ball_x[:, None]
+        y = self.ball_y[:, None]
+        near = self._awake & ((x > self._wall_min_x) & (x < self._wall_max_x) & (y > self._wall_min_y) & (y < self._wall_max_y)).any(axis=1)
+        idx = np.flatnonzero(near)
+        if not idx.size:
+            return
+
+        x = self.ball_x[idx]
+        y = self.ball_y[idx]
+        vx = self.ball_vx[idx]
+        vy = self.ball_vy[idx]
+        restitution = pinball.WALL_RESTITUTION
+        for x1, y1, wx, wy, inv_length_sq, normal_x, normal_y in self.walls:
+            # pinball.wall_collision
+            if inv_length_sq == 0:
+                continue
+            t = np.clip(((x - x1) * wx + (y - y1) * wy) * inv_length_sq, 0, 1)
+            dx = x - (x1 + t * wx)
+            dy = y - (y1 + t * wy)
+            distance = np.sqrt(dx * dx + dy * dy)
+            hit = distance < threshold
+            if not hit.any():
+                continue
+
+            d = distance[hit]
+            zero = d == 0
+            safe_d = np.where(zero, 1.0, d)
+            nx = np.where(zero, normal_x, dx[hit] / safe_d)
+            ny = np.where(zero, normal_y, dy[hit] / safe_d)
+
+            hvx = vx[hit]
+            hvy = vy[hit]
+            dot_product = hvx * nx + hvy * ny
+            hvx = hvx - 2 * dot_product * nx
+            hvy = hvy - 2 * dot_product * ny
+            vx[hit] = hvx * restitution
+            vy[hit] = hvy * restitution
+
+            overlap = threshold - d
+            x[hit] += nx * (overlap + 0.2)
+            y[hit] += ny * (overlap + 0.2)
+
+        self.ball_x[idx] = x
+        self.ball_y[idx] = y
+        self.ball_vx[idx] = vx
+        self.ball_vy[idx] = vy
+
+    def _flipper_transform(self, side):
+        # Flipper._update_transform. np.radians/np.cos/np.sin giver her samme bits som
+        # math-modulet (det tjekker --verify), så scoren forbliver identisk.
+        angle_rad = np.radians(self.flipper_angle[:, side])
+        cos = np.cos(angle_rad)
+        sin = np.sin(angle_rad)
+        end_x = self.flipper_pivot_x[side] + FLIPPER_LENGTH * cos
+        end_y = self.flipper_pivot_y[side] + FLIPPER_LENGTH * sin
+        return cos, sin, end_x, end_y
+
+    def _collide_flipper(self, side):
+        # Flipper.check_collision
+        start_x = self.flipper_pivot_x[side]
+        start_y = self.flipper_pivot_y[side]
+        cos, sin, end_x, end_y = self._flipper_transform(side)
+
+        v_flipper_x = end_x - start_x
+        v_flipper_y = end_y - start_y
+        flipper_length_sq = v_flipper_x * v_flipper_x + v_flipper_y * v_flipper_y
+
+        bx = self.ball_x - start_x
+        by = self.ball_y - start_y
+        t = np.clip((bx * v_flipper_x + by * v_flipper_y) / flipper_length_sq, 0, 1)
+        closest_x = start_x + t * v_flipper_x
+        closest_y = start_y + t * v_flipper_y
+        dx = self.ball_x - closest_x
+        dy = self.ball_y - closest_y
+        distance = np.sqrt(dx * dx + dy * dy)
+
+        threshold = BALL_RADIUS + FLIPPER_WIDTH / 2
+        contact = self._awake & (distance <= threshold)
+
+        # Flipper.swept_through for kugler uden kontakt
+        swing = self.flipper_angle[:, side] - self.flipper_prev_angle[:, side]
+        direction = np.where(swing > 0, 1.0, -1.0)
+        reach = FLIPPER_LENGTH + BALL_RADIUS + FLIPPER_WIDTH / 2
+        swept = (self._awake & ~contact & (swing != 0) & (bx * bx + by * by <= reach * reach)
+                 & (direction * (self._flipper_prev_cos[:, side] * by - self._flipper_prev_sin[:, side] * bx) >= 0)
+                 & (direction * (bx * sin - by * cos) >= 0))
+
+        for i in np.flatnonzero(contact & (distance == 0)):
+            # Kuglens centrum ligger præcis på flipperen: tilfældigt skub
+            rng = self.rngs[i]
+            self.ball_vx[i] = rng.uniform(-1, 1) * 5
+            self.ball_vy[i] = rng.uniform(-1, 1) * 5
+            self.score[i] += 10
+
+        touching = contact & (distance != 0)
+        idx = np.flatnonzero(touching | swept)
+        if not idx.size:
+            return
+
+        is_swept = swept[idx]
+        omega = self.flipper_angular_velocity[idx, side]
+        d = distance[idx]
+        safe_d = np.where(is_swept, 1.0, d)
+        leading = np.where(omega > 0, 1.0, -1.0)
+        nx = np.where(is_swept, -sin[idx] * leading, dx[idx] / safe_d)
+        ny = np.where(is_swept, cos[idx] * leading, dy[idx] / safe_d)
+        d = np.where(is_swept, dx[idx] * nx + dy[idx] * ny, d)
+
+        surface_vx = -omega * (closest_y[idx] - start_y)
+        surface_vy = omega * (closest_x[idx] - start_x)
+        vx = self.ball_vx[idx]
+        vy = self.ball_vy[idx]
+        relative_normal = (vx - surface_vx) * nx + (vy - surface_vy) * ny
+        hit = (relative_normal < 0) | is_swept
+        if not hit.any():
+            return
+
+        idx = idx[hit]
+        nx = nx[hit]
+        ny = ny[hit]
+        relative_normal = relative_normal[hit]
+        impulse = (1 + pinball.FLIPPER_RESTITUTION) * relative_normal
+        push = relative_normal < 0
+        self.ball_vx[idx] = np.where(push, vx[hit] - impulse * nx, vx[hit])
+        self.ball_vy[idx] = np.where(push, vy[hit] - impulse * ny, vy[hit])
+        overlap = threshold - d[hit]
+        self.ball_x[idx] += nx * (overlap + 0.5)
+        self.ball_y[idx] += ny * (overlap + 0.5)
+        self.score[idx] += 10
+
+    def _collide_collectibles(self):
+        # CollectiblePool.collide for alle spil på én gang (samme kvadrerede afstand)
+        reach = COLLECTIBLE_RADIUS + BALL_RADIUS
+        dx = self.collectible_x - self.ball_x[:, None]
+        dy = self.collectible_y - self.ball_y[:, None]
+        dist_sq = dx * dx + dy * dy
+        collected = self.collectible_alive & self._awake[:, None] & (dist_sq < reach * reach)
+        if not collected.any():
+            return
+        self.collectible_alive &= ~collected
+        self.score += COLLECTIBLE_POINTS * collected.sum(axis=1)
+
+        # Alle samleobjekter er samlet: genopret nye
+        for i in np.flatnonzero(collected.any(axis=1) & ~self.collectible_alive.any(axis=1)):
+            self._create_collectibles(i)
+
+
+def _scripted_actions(seed, frames, num_games):
+    rng = np.random.default_rng(seed)
+    return rng.random((frames, num_games, 2)) < 0.1
+
+
+def verify(num_games=8, frames=3000, seed=1234, table=pinball.DEFAULT_TABLE):
+    """Kør de samme spil i den skalare PinballGame og i BatchSimulator og sammenlign."""
+    actions = _scripted_actions(seed, frames, num_games)
+    seeds = [seed + i for i in range(num_games)]
+    sim = BatchSimulator(num_games, seeds, table)
+
+    games = []
+    for i in range(num_games):
+        game = pinball.PinballGame(seed=seeds[i], table=table, headless=True)
+        game.continuous_collision = False
+        game.multiball_balls = 0
+        games.append(game)
+
+    mismatches = 0
+    for frame in range(frames):
+        lost = sim.step(actions[frame, :, 0], actions[frame, :, 1])
+        for i, game in enumerate(games):
+            was_lost = game.balls_lost
+            game.handle_input(pinball.INPUT_LEFT_FLIPPER * bool(actions[frame, i, 0]) |
+                              pinball.INPUT_RIGHT_FLIPPER * bool(actions[frame, i, 1]))
+            game.update()
+            game_lost = game.balls_lost != was_lost
+            if game.score != sim.score[i] or bool(lost[i]) != game_lost:
+                mismatches += 1
+                print(f"Afvigelse i spil {i}, frame {frame}: score {game.score} != {sim.score[i]}")
+    return mismatches == 0
+
+
+def benchmark(num_games, frames, seed=0, table=pinball.DEFAULT_TABLE):
+    sim = BatchSimulator(num_games, [seed + i for i in range(num_games)], table)
+    actions = _scripted_actions(seed, min(frames, 256), num_games)
+    start = time.perf_counter()
+    for frame in range(frames):
+        a = actions[frame % len(actions)]
+        sim.step(a[:, 0], a[:, 1])
+    elapsed = time.perf_counter() - start
+    total = num_games * frames
+    print(f"{num_games} spil x {frames} frames på {elapsed:.2f}s: {total / elapsed:,.0f} frames/s")
+    print(f"Gennemsnitlig score: {sim.score.mean():.1f}, tabte kugler: {sim.balls_lost.sum()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless vektoriseret pinball-simulering")
+    parser.add_argument("--games", type=int, default=8192)
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--table", default=pinball.DEFAULT_TABLE, help="bordfil (.json eller .pbtable)")
+    parser.add_argument("--verify", action="store_true", help="sammenlign med den skalare PinballGame")
+    args = parser.parse_args()
+
+    if args.verify:
+        ok = verify(seed=args.seed, table=args.table)
+        print("OK: samme score og tabte kugler" if ok else "FEJL: batch og skalar afviger")
+        raise SystemExit(0 if ok else 1)
+    benchmark(args.games, args.frames, args.seed, args.table)
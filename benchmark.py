@@ -0,0 +1,303 @@
+"""Mikro-benchmarks for fysik og tegning med regressionstærskler.
+
+Måler Ball.update, hver kollisionsrutine, et helt PinballGame.update og
+PinballGame.draw mod en offscreen surface (SDL dummy-driver) i faste
+scenarier, samt opstarten af en headless worker i en ny proces. Resultaterne
+sammenlignes med en baseline i JSON, og scriptet fejler hvis et tilfælde er
+blevet mere end --threshold procent langsommere.
+
+    python benchmark.py --save-baseline      # gem baseline
+    python benchmark.py --threshold 15       # sammenlign med baseline
+    python benchmark.py -k flipper           # kun tilfælde med "flipper" i navnet
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+import pinball
+from pinball import Ball, CollectiblePool, Flipper, Wall, SCREEN_WIDTH, SCREEN_HEIGHT
+
+BASELINE_FILE = "benchmark_baseline.json"
+
+CASES = {}
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def _make_game(collectibles=None):
+    game = pinball.PinballGame(seed=1234)
+    game.save_highscore = lambda: None
+    game.window = game.screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)) # Offscreen
+    game.load_assets(wait=True) # Baggrunden skal være på plads før der måles
+    if collectibles is not None:
+        game.collectibles.clear()
+        rng = random.Random(99)
+        for _ in range(collectibles):
+            game.collectibles.spawn(rng.randint(200, SCREEN_WIDTH - 200), rng.randint(150, SCREEN_HEIGHT - 350))
+    return game
+
+
+def _place(ball, x, y, vx, vy):
+    ball.x, ball.y, ball.vx, ball.vy = x, y, vx, vy
+
+
+# --- Enkelte rutiner ---
+
+@case("ball_update")
+def _ball_update():
+    ball = Ball(368, 400)
+
+    def run():
+        _place(ball, 368, 400, 1.5, -2.0)
+        ball.update()
+    return run
+
+
+@case("wall_collision_miss")
+def _wall_miss():
+    wall = Wall(170, 230, 170, SCREEN_HEIGHT - 280)
+    ball = Ball(368, 400)
+
+    def run():
+        wall.check_collision(ball)
+    return run
+
+
+@case("wall_collision_rolling")
+def _wall_rolling():
+    # Kuglen ruller ned ad den venstre skrå væg mod flipperen
+    wall = Wall(170, SCREEN_HEIGHT - 280, SCREEN_WIDTH // 2 - 130, SCREEN_HEIGHT - 130)
+    ball = Ball(0, 0)
+
+    def run():
+        _place(ball, 200, SCREEN_HEIGHT - 280, 2.0, 1.5)
+        wall.check_collision(ball)
+    return run
+
+
+@case("flipper_collision_rapid")
+def _flipper_rapid():
+    flipper = Flipper(SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT - 120, True)
+    flipper.activate()
+    ball = Ball(0, 0)
+
+    def run():
+        flipper.update()
+        if flipper.angle == flipper.target_angle:
+            flipper.angle = flipper.rest_angle # Slå igen og igen
+        end_x, end_y = flipper.get_end_point()
+        _place(ball, (flipper.pivot_x + end_x) / 2, (flipper.pivot_y + end_y) / 2 - 14, 0.5, 4.0)
+        flipper.check_collision(ball)
+    return run
+
+
+@case("flipper_polygon_points")
+def _flipper_polygon():
+    flipper = Flipper(SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT - 120, True)
+
+    def run():
+        flipper.get_flipper_polygon_points()
+    return run
+
+
+def _collectible_case(name, count):
+    @case(name)
+    def setup():
+        pool = CollectiblePool()
+        rng = random.Random(99)
+        for _ in range(count):
+            pool.spawn(rng.randint(200, SCREEN_WIDTH - 200), rng.randint(150, SCREEN_HEIGHT - 350))
+        ball = Ball(368, 800) # Under området hvor samleobjekterne ligger: ingen træffere
+
+        def run():
+            pool.collide(ball)
+        return run
+
+
+_collectible_case("collectible_collision_10", 10)
+_collectible_case("collectible_collision_1000", 1000)
+_collectible_case("collectible_collision_5000", 5000)
+
+
+# --- Hele frames ---
+
+def _frame_case(name, collectibles=None, flipping=False, ball_state=None, asleep=False):
+    @case(name)
+    def setup():
+        game = _make_game(collectibles)
+        game.balls_left = 10**9
+        start = (game.balls[0].x, game.balls[0].y, game.balls[0].vx, game.balls[0].vy)
+        frame = [0]
+
+        def run():
+            if not game.balls:
+                game._spawn_new_ball()
+            del game.balls[1:]
+            if ball_state:
+                ball = game.balls[0]
+                _place(ball, *ball_state)
+                # Kuglen placeres igen hvert frame, så hviledetektoren holdes i den ønskede tilstand
+                if asleep:
+                    ball.asleep = True
+                    ball.sleep_time = 0.0
+                else:
+                    ball.wake()
+            elif frame[0] % 120 == 0:
+                _place(game.balls[0], *start)
+            frame[0] += 1
+            bits = 0
+            if flipping and frame[0] % 10 < 5:
+                bits = pinball.INPUT_LEFT_FLIPPER | pinball.INPUT_RIGHT_FLIPPER
+            game.handle_input(bits)
+            game.update()
+        return run
+
+
+_frame_case("game_update_idle_ball", ball_state=(368, 400, 0.0, -0.3))
+_frame_case("game_update_sleeping_ball", ball_state=(368, 400, 0.0, 0.0), asleep=True)
+_frame_case("game_update_rolling_on_wall", ball_state=(200, SCREEN_HEIGHT - 280, 2.0, 1.5))
+_frame_case("game_update_rapid_flipper_hits", flipping=True)
+_frame_case("game_update_10_collectibles", collectibles=10)
+_frame_case("game_update_1000_collectibles", collectibles=1000)
+
+
+def _draw_case(name, collectibles, render_mode="full"):
+    @case(name)
+    def setup():
+        game = _make_game(collectibles)
+        game.render_mode = render_mode
+
+        def run():
+            game.draw()
+        return run
+
+
+_draw_case("game_draw_10_collectibles", 10)
+_draw_case("game_draw_1000_collectibles", 1000)
+_draw_case("game_draw_dirty_10_collectibles", 10, "dirty")
+
+
+# --- Tilstand ---
+
+@case("game_snapshot_restore")
+def _snapshot_restore():
+    # Lookahead-søgning: tilbage til samme øjeblik igen og igen
+    game = _make_game()
+    snapshot = game.snapshot()
+
+    def run():
+        game.restore(snapshot)
+    return run
+
+
+# --- Opstart ---
+
+_COLD_START = """
+import sys
+import pinball
+game = pinball.PinballGame(seed=1, headless=True)
+game.update()
+loaded = [name for name in ("pygame", "numpy", "threading") if name in sys.modules]
+if loaded:
+    sys.exit(f"headless-opstarten importerede {loaded}")
+"""
+
+
+@case("headless_cold_start")
+def _headless_cold_start():
+    # En ny proces: interpreter, import af pinball, bord, PinballGame(headless=True) og første update
+    command = [sys.executable, "-c", _COLD_START]
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    def run():
+        subprocess.run(command, check=True, cwd=cwd, stdout=subprocess.DEVNULL)
+    return run
+
+
+# --- Kørsel ---
+
+def measure(run, min_time=0.5, repeats=7):
+    # Kalibrerer antal kald så én gentagelse tager mindst min_time/repeats (det
+    # varmer også op), og returnerer den hurtigste tid pr. kald i mikrosekunder
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeats:
+            break
+        number *= 2
+
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for pinball-fysik og tegning")
+    parser.add_argument("-k", dest="pattern", help="kør kun tilfælde hvis navn indeholder denne tekst")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="JSON-fil med baseline-resultater")
+    parser.add_argument("--save-baseline", action="store_true", help="gem resultaterne som ny baseline")
+    parser.add_argument("--threshold", type=float, default=10.0, help="tilladt forværring i procent")
+    parser.add_argument("--min-time", type=float, default=0.5, help="sekunder pr. tilfælde")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w") # Spillets egne beskeder forstyrrer tabellen
+    results = {}
+    try:
+        for name, setup in CASES.items():
+            if args.pattern and args.pattern not in name:
+                continue
+            results[name] = measure(setup(), args.min_time)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    regressions = []
+    for name, us in results.items():
+        line = f"{name:36s} {us:10.2f} µs"
+        if name in baseline and not args.save_baseline:
+            change = (us - baseline[name]) / baseline[name] * 100
+            line += f"  {change:+6.1f}% mod baseline"
+            if change > args.threshold:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline gemt i {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} tilfælde er mere end {args.threshold:g}% langsommere end baseline")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
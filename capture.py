@@ -0,0 +1,211 @@
+"""Optagelse af gameplay-video direkte fra skærmens pixelbuffer.
+
+FrameCapture kopierer hver tegnet frame fra surfacens rå buffer
+(Surface.get_view) ind i en ring af genbrugte buffere og giver den videre til
+en skrivetråd. Der allokeres intet pr. frame. Er skrivetråden bagud, og
+ringen er fuld, droppes framen i stedet for at frame-løkken venter.
+
+To formater vælges ud fra filnavnet:
+
+    .raw    rå frames efter hinanden (ffmpeg -f rawvideo), ingen header
+    andet   komprimeret frame-sekvens (zlib pr. frame):
+            magic "PBVID", version (u8), bredde, højde, pitch (u16), pixelformat (8 bytes, ffmpeg-navn),
+            derefter pr. frame: framenummer (u32), tidspunkt i sekunder (f64), type (u8), længde (u32), data
+
+En frame er enten en nøgleframe (hele billedet) eller, når NumPy er
+installeret, en delta: XOR med den forrige skrevne frame. Baggrund og vægge
+står stille, så deltaen er næsten kun nuller og pakker til en brøkdel.
+
+Framenummeret tæller alle tegnede frames, så droppede frames kan ses som huller
+(i .raw forsvinder de bare).
+En .pbvid-fil pakkes ud til rå video med:
+
+    python capture.py session.pbvid -o session.raw
+"""
+import queue
+import struct
+import threading
+import time
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None # Kun nøgleframes; XOR i ren Python ville holde GIL'en for længe
+
+CAPTURE_MAGIC = b"PBVID"
+CAPTURE_VERSION = 1
+CAPTURE_RING = 8 # Framebuffere i ringen; flere giver skrivetråden mere luft før der droppes
+CAPTURE_COMPRESSION = 1 # zlib-niveau: hurtigt, og skærmbilleder med store ensfarvede flader pakker godt
+_HEADER = struct.Struct("<5sBHHH8s")
+CAPTURE_KEYFRAME_EVERY = 60 # Skrevne frames mellem nøgleframes, så en beskadiget delta ikke ødelægger resten
+_FRAME = struct.Struct("<IdBI")
+FRAME_KEY = 0
+FRAME_DELTA = 1
+
+
+def ffmpeg_command(path, pixel_format, pitch, height, fps):
+    # Bredden tages fra pitch, så eventuel udfyldning i rækkerne kommer med som en kant til højre
+    width = pitch // (3 if pixel_format.endswith("24") else 4)
+    return f"ffmpeg -f rawvideo -pixel_format {pixel_format} -video_size {width}x{height} -framerate {fps:g} -i {path} video.mp4"
+
+
+def pixel_format(surface):
+    # ffmpeg-navnet for surfacens pixellayout (little-endian bytes), eller None hvis det ikke understøttes
+    size = surface.get_bytesize()
+    if size not in (3, 4):
+        return None
+    names = ["0"] * size if size == 4 else ["?"] * size
+    for mask, shift, channel in zip(surface.get_masks(), surface.get_shifts(), "rgba"):
+        if mask:
+            names[shift // 8] = channel
+    if "?" in names:
+        return None
+    return "".join(names) + ("24" if size == 3 else "")
+
+
+class FrameCapture:
+    def __init__(self, path, surface, ring=CAPTURE_RING):
+        self.path = path
+        self.raw = path.endswith(".raw")
+        self.width, self.height = surface.get_size()
+        self.pitch = surface.get_pitch()
+        self.pixel_format = pixel_format(surface)
+        if self.pixel_format is None:
+            raise ValueError(f"skærmens pixelformat ({surface.get_bitsize()} bit) kan ikke optages")
+
+        frame_size = self.pitch * self.height
+        self.buffers = [bytearray(frame_size) for _ in range(ring)]
+        self.free = queue.SimpleQueue() # Ledige pladser i ringen
+        for slot in range(ring):
+            self.free.put(slot)
+        self.filled = queue.SimpleQueue() # (plads, framenummer, tidspunkt) til skrivetråden; None stopper den
+
+        self.frames = 0
+        self.written = 0
+        self.dropped = 0
+        self.start_time = time.perf_counter()
+
+        # Skrivetrådens egne buffere: forrige skrevne frame og plads til deltaen
+        self.previous = bytearray(frame_size)
+        if np is not None and not self.raw:
+            self._previous_view = np.frombuffer(self.previous, dtype=np.uint8)
+            self._delta = np.empty(frame_size, dtype=np.uint8)
+
+        self.file = open(path, "wb")
+        if not self.raw:
+            self.file.write(_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, self.width, self.height, self.pitch,
+                                         self.pixel_format.encode()))
+        self.thread = threading.Thread(target=self._writer, name="capture-writer", daemon=True)
+        self.thread.start()
+
+    def grab(self, surface):
+        # Kaldes i hovedtråden efter tegningen. Kopierer framen ind i en ledig buffer, eller dropper den
+        number = self.frames
+        self.frames += 1
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+
+        try:
+            view = surface.get_view("0")
+        except ValueError:
+            view = surface.get_buffer() # Rækkerne har udfyldning; bufferen med pitch tages som den er
+        self.buffers[slot][:] = view
+        del view # Låser surfacen op igen før den flippes
+        self.filled.put((slot, number, time.perf_counter() - self.start_time))
+        return True
+
+    def _writer(self):
+        while True:
+            item = self.filled.get()
+            if item is None:
+                return
+            slot, number, timestamp = item
+            frame = self.buffers[slot]
+            try:
+                if self.raw:
+                    self.file.write(frame)
+                else:
+                    self._write_compressed(frame, number, timestamp)
+                self.written += 1
+            except OSError as e:
+                print(f"Kunne ikke skrive video: {e}")
+            finally:
+                self.free.put(slot)
+
+    def _write_compressed(self, frame, number, timestamp):
+        # NumPy og zlib frigiver GIL'en, så frame-løkken kører videre imens
+        if np is not None and self.written % CAPTURE_KEYFRAME_EVERY:
+            np.bitwise_xor(np.frombuffer(frame, dtype=np.uint8), self._previous_view, out=self._delta)
+            kind, data = FRAME_DELTA, zlib.compress(self._delta, CAPTURE_COMPRESSION)
+        else:
+            kind, data = FRAME_KEY, zlib.compress(frame, CAPTURE_COMPRESSION)
+        self.previous[:] = frame
+        self.file.write(_FRAME.pack(number, timestamp, kind, len(data)))
+        self.file.write(data)
+
+    def close(self):
+        # Skriver de frames der allerede er i kø og lukker filen
+        self.filled.put(None)
+        self.thread.join()
+        self.file.close()
+
+
+def read_frames(path):
+    # Giver (framenummer, tidspunkt, rå frame) for hver frame i en .pbvid-fil
+    previous = None
+    with open(path, "rb") as f:
+        magic, version, width, height, pitch, pixel_format = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION:
+            raise ValueError(f"{path} er ikke en pinball-video (version {CAPTURE_VERSION})")
+        while True:
+            header = f.read(_FRAME.size)
+            if len(header) < _FRAME.size:
+                return
+            number, timestamp, kind, length = _FRAME.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return # Afbrudt sidste frame
+            frame = zlib.decompress(data)
+            if kind == FRAME_DELTA:
+                if np is not None:
+                    frame = np.bitwise_xor(np.frombuffer(frame, dtype=np.uint8), np.frombuffer(previous, dtype=np.uint8)).tobytes()
+                else:
+                    frame = (int.from_bytes(frame, "little") ^ int.from_bytes(previous, "little")).to_bytes(len(frame), "little")
+            previous = frame
+            yield number, timestamp, frame
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pak en pinball-video (.pbvid) ud til rå frames til ffmpeg")
+    parser.add_argument("path", help="video optaget med pinball.py --capture")
+    parser.add_argument("-o", "--output", help="rå video (standard: samme navn med .raw)")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f:
+        _, _, width, height, pitch, fmt = _HEADER.unpack(f.read(_HEADER.size))
+    fmt = fmt.rstrip(b"\0").decode()
+    output = args.output or args.path.rsplit(".", 1)[0] + ".raw"
+    frames = 0
+    missing = 0
+    previous = -1
+    first_time = last_time = 0.0
+    with open(output, "wb") as out:
+        for number, timestamp, frame in read_frames(args.path):
+            if frames == 0:
+                first_time = timestamp
+            missing += number - previous - 1
+            previous = number
+            last_time = timestamp
+            out.write(frame)
+            frames += 1
+
+    # Framerate ud fra tidsstemplerne for de frames der faktisk blev skrevet
+    fps = (frames - 1) / (last_time - first_time) if frames > 1 and last_time > first_time else 60
+    print(f"{frames} frames skrevet til {output} ({missing} droppet under optagelsen)")
+    print(ffmpeg_command(output, fmt, pitch, height, fps))
@@ -0,0 +1,170 @@
+"""Leaderboard med journal, komprimeret indeks og skrivning i en baggrundstråd.
+
+Hver afsluttet session tilføjes som en linje til en append-only journal
+("score tidspunkt seed"). Med jævne mellemrum og ved lukning flettes
+journalen ind i et indeks med de bedste LEADERBOARD_SIZE resultater. Indekset
+skrives til en midlertidig fil og omdøbes atomisk på plads. Journalen har
+et generationsnummer, og indekset gemmer den generation der skal skrives til
+derefter. Et nedbrud midt i en komprimering efterlader derfor enten det gamle
+indeks og den gamle journal eller det nye indeks og en tom journal, aldrig
+dubletter eller tab.
+
+Opstarten læser kun indekset. Den aktuelle journal læses af skrivetråden,
+så frame-løkken aldrig venter på disken.
+
+Skrivetråden har sin egen liste over indgange der står i indekset eller
+journalen, og komprimerer kun den. En score der stadig ligger i køen kommer
+derfor ikke i indekset før den er skrevet i journalen.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+LEADERBOARD_SIZE = 10 # Resultater i det komprimerede indeks
+LEADERBOARD_COMPACT_EVERY = 20 # Journalindgange mellem komprimeringer
+LEADERBOARD_INDEX = "leaderboard.json"
+LEADERBOARD_JOURNAL = "leaderboard.journal"
+LEGACY_HIGHSCORE = "highscore.txt"
+
+
+class Leaderboard:
+    def __init__(self, directory=".", size=LEADERBOARD_SIZE):
+        self.directory = directory
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = [] # (score, tidspunkt, seed), bedste først; det spillet viser
+        self.journaled = [] # Skrivetrådens: kun indgange der står i indekset eller journalen
+        self.generation = 0
+        self.pending = 0 # Indgange i journalen siden seneste komprimering
+        self._load_index()
+
+        self.commands = queue.Queue()
+        self.thread = threading.Thread(target=self._writer, name="leaderboard-writer", daemon=True)
+        self.thread.start()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _journal_path(self, generation):
+        return self._path(f"{LEADERBOARD_JOURNAL}.{generation}")
+
+    def _load_index(self):
+        try:
+            with open(self._path(LEADERBOARD_INDEX)) as f:
+                index = json.load(f)
+            self.generation = index["generation"]
+            self.entries = [tuple(entry) for entry in index["scores"]]
+            self.journaled = list(self.entries)
+        except FileNotFoundError:
+            # Første start efter highscore.txt: den gamle highscore bliver den første indgang
+            try:
+                with open(self._path(LEGACY_HIGHSCORE)) as f:
+                    self.entries = [(int(f.read()), 0.0, None)]
+                self.journaled = list(self.entries)
+            except (OSError, ValueError):
+                pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Kunne ikke læse leaderboard: {e}")
+
+    def _merge(self, entries, new_entries):
+        # For self.entries kaldes den med låsen holdt
+        entries.extend(new_entries)
+        entries.sort(key=lambda entry: (-entry[0], entry[1]))
+        del entries[self.size:]
+
+    # --- Hovedtråden ---
+
+    def best(self):
+        with self.lock:
+            return self.entries[0][0] if self.entries else 0
+
+    def top(self):
+        with self.lock:
+            return list(self.entries)
+
+    def submit(self, score, seed=None):
+        # Returnerer med det samme; journalen skrives af skrivetråden
+        entry = (score, time.time(), seed)
+        with self.lock:
+            self._merge(self.entries, [entry])
+        self.commands.put(("score", entry))
+
+    def close(self):
+        # Skriver resten af køen, komprimerer og venter på tråden
+        self.commands.put(("close", None))
+        self.thread.join()
+
+    # --- Skrivetråden ---
+
+    def _writer(self):
+        self._replay_journal()
+        while True:
+            command, entry = self.commands.get()
+            if command == "close":
+                if self.pending:
+                    self._compact()
+                return
+            self._append(entry)
+            if self.pending >= LEADERBOARD_COMPACT_EVERY:
+                self._compact()
+
+    def _replay_journal(self):
+        # Indgange fra før et nedbrud eller fra sidste kørsel, som endnu ikke er komprimeret.
+        # En afbrudt sidste linje (uden linjeskift) springes over.
+        entries = []
+        try:
+            with open(self._journal_path(self.generation)) as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    score, timestamp, seed = line.split()
+                    entries.append((int(score), float(timestamp), None if seed == "-" else int(seed)))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Kunne ikke læse leaderboard-journal: {e}")
+        with self.lock:
+            self._merge(self.entries, entries)
+        self._merge(self.journaled, entries)
+        self.pending = len(entries)
+
+    def _append(self, entry):
+        score, timestamp, seed = entry
+        try:
+            with open(self._journal_path(self.generation), "a") as f:
+                f.write(f"{score} {timestamp!r} {'-' if seed is None else seed}\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.pending += 1
+        except OSError as e:
+            print(f"Kunne ikke skrive leaderboard-journal: {e}")
+            return
+        self._merge(self.journaled, [entry])
+
+    def _compact(self):
+        # Kun det der står i journalen; self.entries kan have scores der stadig ligger i køen
+        index = {"generation": self.generation + 1, "scores": [list(entry) for entry in self.journaled]}
+        path = self._path(LEADERBOARD_INDEX)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(index, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Kunne ikke skrive leaderboard: {e}")
+            return
+
+        # Indekset peger nu på den næste generation; den gamle journal er flettet ind
+        old_journal = self._journal_path(self.generation)
+        self.generation += 1
+        self.pending = 0
+        try:
+            os.remove(old_journal)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Kunne ikke fjerne gammel leaderboard-journal: {e}")
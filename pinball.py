@@ -1,7 +1,14 @@
-import pygame
 import math
 import random
 import os
+import time
+from array import array
+from collections import OrderedDict
+from operator import attrgetter
+
+from assets import ASSET_CACHE_DIR, AssetCache
+from recording import InputRecorder
+from table import TABLE_FIELDS, build_grid, load_table, segment_geometry, table_digest
 
 
 # Colors
@@ -15,65 +22,225 @@ YELLOW = (255, 255, 0)
 DARK_BLUE = (0, 0, 100)
 LIGHT_GRAY = (200, 200, 200)
 
+# pygame og NumPy importeres først når de skal bruges: headless (PinballGame(headless=True))
+# kører fysikken uden vindue, lyd og assets, og modulet kan importeres uden at åbne enheder
+pygame = None
+np = None
+
+
+def init_pygame(devices=True):
+    # Importerer pygame og initialiserer vindue og lyd. Kaldes af PinballGame uden headless;
+    # devices=False importerer kun, hvilket er nok til at tegne offscreen på en Surface
+    global pygame
+    if pygame is None:
+        import pygame as module
+        pygame = module
+    if devices and not pygame.get_init():
+        pygame.init()
+        pygame.mixer.init() # INITIALISER PYGAME MIXER FOR LYD
 
-# Initialize Pygame
-pygame.init()
-pygame.mixer.init() # INITIALISER PYGAME MIXER FOR LYD
+
+def _load_numpy():
+    # Returnerer numpy, eller False hvis det ikke er installeret
+    global np
+    if np is None:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = False # Samleobjekterne testes så med en løkke i ren Python
+    return np
 
 
 # Constants
 SCREEN_WIDTH = 736
 SCREEN_HEIGHT = 1024
-FPS = 60
+FPS = 60 # Standard-framerate for tegningen
+PHYSICS_BASE_HZ = 60 # Hastigheder og konstanterne nedenfor er angivet pr. fysiktrin ved denne rate
+PHYSICS_HZ = 60 # Fast trinrate for fysikken (uafhængig af skærmens framerate)
+MAX_CATCHUP_STEPS = 5 # Højst så mange fysiktrin pr. tegnet frame; resten af efterslæbet droppes
 GRAVITY = 0.3
+BALL_DAMPING = 0.999 # Hastighed bevaret pr. frame (luftmodstand)
+WALL_RESTITUTION = 0.8 # Andel af hastigheden kuglen beholder efter et vægstød
+FLIPPER_SWING = 0.2 # Andel af den resterende vinkel flipperen drejer pr. frame
+FLIPPER_RESTITUTION = 1.0 # Andel af den relative normalfart kuglen beholder (1.0: en stillestående flipper spejler kuglen)
 BALL_RADIUS = 12
 FLIPPER_LENGTH = 80
 FLIPPER_WIDTH = 8
 WALL_THICKNESS = 8
-STUCK_THRESHOLD = 0.5 # Hastighedstærskel for at bolden anses for at sidde fast
+SLEEP_DISTANCE = 2.0 # Kuglen er i hvile så længe den holder sig inden for denne afstand af sit hvilepunkt
+SLEEP_AFTER = 30 # Trin i hvile (ved PHYSICS_BASE_HZ) før kuglen lægges i dvale
+SLEEP_RESPAWN_AFTER = 180 # Trin i dvale før kuglen anses for at sidde fast og erstattes af en ny
 
 COLLECTIBLE_RADIUS = 8
 COLLECTIBLE_POINTS = 50
 COLLECTIBLE_COLOR = GREEN
 COLLECTIBLE_MAX_COUNT = 10 # Maksimum antal samleobjekter
+COLLECTIBLE_VECTOR_MIN = 64 # Fra så mange pladser i brug testes samleobjekterne vektoriseret med NumPy
+
+MULTIBALL_BALLS = 2 # Ekstra kugler der sendes ind når alle samleobjekter er samlet
+
+# Input pr. frame som bits, så det kan optages og afspilles
+INPUT_LEFT_FLIPPER = 1
+INPUT_RIGHT_FLIPPER = 2
+INPUT_RESET_BALL = 4
+INPUT_NEW_GAME = 8
+
+# Kontinuert kollision: et frame deles kun op, når kuglen eller en flipperspids
+# flytter sig mere end SUBSTEP_MAX_TRAVEL pixels
+SUBSTEP_MAX_TRAVEL = BALL_RADIUS
+MAX_SUBSTEPS = 8
+CONTACT_SKIN = 0.05 # Kuglen placeres så meget inden for kontaktafstanden ved time of impact
+FLIPPER_SWEEP_SAMPLES = 8
+
+BROADPHASE_CELL_SIZE = 64 # Cellestørrelse i væggenes spatial hash
+
+DEFAULT_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tables", "default.json")
+
+TEXT_CACHE_SIZE = 64 # Antal renderede tekster der holdes i cachen
+FLIPPER_SPRITE_STEP = 1.0 # Flippersprites caches pr. så mange grader (spidsen flytter sig ca. 1,4 px pr. grad)
+SPRITE_COLORKEY = (255, 0, 255) # Gennemsigtig farve i sprites; colorkey med RLE blitter langt hurtigere end alpha
+
+# Lyd
+SOUND_VOICES = 6 # Mixer-kanaler til lydeffekter (musikken har sin egen)
+SOUND_MIN_IMPACT = 1.0 # Stødfart (normalkomposant) under dette giver ingen lyd
+SOUND_FULL_VOLUME_SPEED = 12.0 # Stødfart der giver fuld lydstyrke
+
+# Kvalitet: niveauerne står bedst først. navn -> (tegneskala, baggrundsbillede, lydkanaler, musik, glimt på samleobjekter).
+# Tegneskalaen skal være 1/heltal: en opskalering med et helt tal er ét billigt gennemløb, en skæv faktor koster mere end den sparer
+QUALITY_LEVELS = {
+    "high": (1.0, True, SOUND_VOICES, True, True),
+    "medium": (1.0, True, SOUND_VOICES // 2, True, False),
+    "low": (1.0, False, SOUND_VOICES // 2, False, False),
+    "minimal": (0.5, False, 2, False, False),
+}
+QUALITY_BUDGET_DOWN = 0.9 # Arbejdstid pr. frame over denne andel af frame-budgettet tæller som for langsom
+QUALITY_BUDGET_UP = 0.5 # Under denne andel er der plads til et niveau højere
+QUALITY_DOWN_FRAMES = 30 # Frames i træk for langsomt før der skiftes et niveau ned
+QUALITY_UP_FRAMES = 300 # Frames i træk med luft før der skiftes et niveau op
+QUALITY_UP_MAX_FRAMES = 2400 # Ventetiden fordobles hver gang et skift op må trækkes tilbage, op til dette
+QUALITY_SMOOTHING = 0.1 # Vægten af den nyeste frame i det glidende gennemsnit
+
+# Profiler
+PROFILE_PHASES = ("input", "update", "draw", "flip", "tick") # Faserne i run-løkken, i rækkefølge
+PHASE_INPUT, PHASE_UPDATE, PHASE_DRAW, PHASE_FLIP, PHASE_TICK = range(len(PROFILE_PHASES))
+PROFILE_HISTORY = 240 # Frames i ringbufferen (4 sekunder ved 60 FPS)
+PROFILE_BIN_MS = 0.5 # Bredde af histogrammets bins
+PROFILE_BINS = 100 # Bins op til 50 ms; længere tider tælles i den sidste
+PROFILE_OVERLAY_REFRESH = 15 # Overlayet tegnes om hver 15. frame
+
+
+def circle_time_of_impact(x0, y0, dx, dy, cx, cy, reach):
+    # Første t i [0, 1] hvor punktet (x0, y0) + t * (dx, dy) når ind til reach fra (cx, cy).
+    # Overlap fra start er ikke et nyt sammenstød og klares af den diskrete test.
+    fx = x0 - cx
+    fy = y0 - cy
+    a = dx * dx + dy * dy
+    c = fx * fx + fy * fy - reach * reach
+    if c <= 0 or a == 0:
+        return None
+    b = fx * dx + fy * dy
+    disc = b * b - a * c
+    if b >= 0 or disc < 0:
+        return None
+    t = (-b - math.sqrt(disc)) / a
+    return t if t <= 1 else None
 
 
 class Ball:
-    def __init__(self, x, y):
+    def __init__(self, x, y, rng=random):
         self.x = x
         self.y = y
-        self.vx = random.uniform(-2, 2)
+        self.vx = rng.uniform(-2, 2)
         self.vy = 0
         self.radius = BALL_RADIUS
-
-    def update(self):
-        self.vy += GRAVITY
-        self.x += self.vx
-        self.y += self.vy
+        self.prev_x = x # Position ved starten af seneste fysiktrin (til interpoleret tegning)
+        self.prev_y = y
+        # Hviledetektor: hvilepunktet flyttes med, når kuglen kommer mere end SLEEP_DISTANCE væk
+        self.asleep = False
+        self.rest_x = x
+        self.rest_y = y
+        self.rest_time = 0.0
+        self.sleep_time = 0.0
+
+    def update(self, dt=1.0):
+        # dt er trinlængden målt i trin ved PHYSICS_BASE_HZ (1.0 ved standardraten)
+        self.prev_x = self.x
+        self.prev_y = self.y
+        self.vy += GRAVITY * dt
+        self.x += self.vx * dt
+        self.y += self.vy * dt
 
         if self.x - self.radius <= 0:
             self.x = self.radius
-            self.vx = abs(self.vx) * 0.8
+            self.vx = abs(self.vx) * WALL_RESTITUTION
         elif self.x + self.radius >= SCREEN_WIDTH:
             self.x = SCREEN_WIDTH - self.radius
-            self.vx = -abs(self.vx) * 0.8
+            self.vx = -abs(self.vx) * WALL_RESTITUTION
 
         if self.y - self.radius <= 0:
             self.y = self.radius
-            self.vy = abs(self.vy) * 0.8
-
-        self.vx *= 0.999
-        self.vy *= 0.999
+            self.vy = abs(self.vy) * WALL_RESTITUTION
+
+        damping = BALL_DAMPING ** dt
+        self.vx *= damping
+        self.vy *= damping
+
+    def track_rest(self, dt=1.0):
+        # Kaldes efter kollisionerne. Har kuglen ligget inden for SLEEP_DISTANCE i SLEEP_AFTER trin, sover den
+        dx = self.x - self.rest_x
+        dy = self.y - self.rest_y
+        if dx * dx + dy * dy > SLEEP_DISTANCE * SLEEP_DISTANCE:
+            self.rest_x = self.x
+            self.rest_y = self.y
+            self.rest_time = 0.0
+            return
+        self.rest_time += dt
+        if self.rest_time >= SLEEP_AFTER:
+            self.asleep = True
+            self.sleep_time = 0.0
+            self.vx = 0.0
+            self.vy = 0.0
+            self.prev_x = self.x # Ingen interpolation mens den sover
+            self.prev_y = self.y
+
+    def wake(self):
+        self.asleep = False
+        self.rest_x = self.x
+        self.rest_y = self.y
+        self.rest_time = 0.0
+
+    def get_state(self):
+        return (self.x, self.y, self.vx, self.vy, self.prev_x, self.prev_y,
+                self.asleep, self.rest_x, self.rest_y, self.rest_time, self.sleep_time)
+
+    @classmethod
+    def from_state(cls, state):
+        ball = cls.__new__(cls)
+        (ball.x, ball.y, ball.vx, ball.vy, ball.prev_x, ball.prev_y,
+         ball.asleep, ball.rest_x, ball.rest_y, ball.rest_time, ball.sleep_time) = state
+        ball.radius = BALL_RADIUS
+        return ball
 
     def get_speed(self):
         return math.sqrt(self.vx**2 + self.vy**2)
 
-    def draw(self, screen):
-        pygame.draw.circle(screen, RED, (int(self.x), int(self.y)), self.radius)
-        pygame.draw.circle(screen, WHITE, (int(self.x - 3), int(self.y - 3)), 3)
+    def drawn_position(self, alpha=1.0):
+        # alpha < 1 giver positionen mellem de to seneste fysiktrin
+        return self.prev_x + (self.x - self.prev_x) * alpha, self.prev_y + (self.y - self.prev_y) * alpha
+
+    def draw(self, screen, alpha=1.0):
+        x, y = self.drawn_position(alpha)
+        rect = pygame.draw.circle(screen, RED, (int(x), int(y)), self.radius)
+        pygame.draw.circle(screen, WHITE, (int(x - 3), int(y - 3)), 3)
+        return rect
 
 class Flipper:
-    def __init__(self, x, y, left_flipper=True):
+    # Kinematisk flipper: vinklen styres af input, og vinkelhastigheden i seneste
+    # frame giver fladens fart i kontaktpunktet. cos/sin, endepunkt og polygon
+    # regnes kun ud når vinklen har ændret sig.
+    def __init__(self, x, y, left_flipper=True, rng=random):
+        self.rng = rng
         self.pivot_x = x
         self.pivot_y = y
         self.length = FLIPPER_LENGTH
@@ -85,6 +252,32 @@ class Flipper:
         self.target_angle = self.angle
         self.is_active = False
 
+        self._transform_angle = None
+        self._update_transform()
+        self.prev_angle = self.angle # Vinkel ved starten af seneste fysiktrin
+        self.prev_cos = self.cos
+        self.prev_sin = self.sin
+        self.angular_velocity = 0.0 # Radianer pr. trin ved PHYSICS_BASE_HZ
+
+    def _geometry(self, angle):
+        angle_rad = math.radians(angle)
+        cos = math.cos(angle_rad)
+        sin = math.sin(angle_rad)
+        fx = self.length * cos
+        fy = self.length * sin
+
+        px = -self.width / 2 * sin
+        py = self.width / 2 * cos
+        polygon = [(self.pivot_x + px, self.pivot_y + py),
+                   (self.pivot_x - px, self.pivot_y - py),
+                   (self.pivot_x - px + fx, self.pivot_y - py + fy),
+                   (self.pivot_x + px + fx, self.pivot_y + py + fy)]
+        return cos, sin, self.pivot_x + fx, self.pivot_y + fy, polygon
+
+    def _update_transform(self):
+        self.cos, self.sin, self.end_x, self.end_y, self.polygon = self._geometry(self.angle)
+        self._transform_angle = self.angle
+
     def activate(self):
         self.is_active = True
         self.target_angle = self.active_angle
@@ -93,53 +286,86 @@ class Flipper:
         self.is_active = False
         self.target_angle = self.rest_angle
 
-    def update(self):
+    def get_state(self):
+        return (self.angle, self.target_angle, self.is_active, self.prev_angle,
+                self.prev_cos, self.prev_sin, self.angular_velocity)
+
+    def set_state(self, state):
+        # cos/sin, endepunkt og polygon følger med af sig selv, da de regnes ud når vinklen ændres
+        (self.angle, self.target_angle, self.is_active, self.prev_angle,
+         self.prev_cos, self.prev_sin, self.angular_velocity) = state
+
+    def update(self, dt=1.0):
+        if self.angle != self._transform_angle:
+            self._update_transform()
+        self.prev_angle = self.angle
+        self.prev_cos = self.cos
+        self.prev_sin = self.sin
+
+        # FLIPPER_SWING gælder pr. trin ved PHYSICS_BASE_HZ; andre trinlængder giver samme kurve over tid
+        swing = FLIPPER_SWING if dt == 1.0 else 1 - (1 - FLIPPER_SWING) ** dt
         angle_diff = self.target_angle - self.angle
         if abs(angle_diff) > 0.5:
-            self.angle += angle_diff * 0.2
+            self.angle += angle_diff * swing
         else:
             self.angle = self.target_angle
+        self.angular_velocity = math.radians(self.angle - self.prev_angle) / dt
 
     def get_end_point(self):
-        angle_rad = math.radians(self.angle)
-        end_x = self.pivot_x + self.length * math.cos(angle_rad)
-        end_y = self.pivot_y + self.length * math.sin(angle_rad)
-        return end_x, end_y
+        if self.angle != self._transform_angle:
+            self._update_transform()
+        return self.end_x, self.end_y
 
     def get_flipper_polygon_points(self):
-        angle_rad = math.radians(self.angle)
-
-        fx = self.length * math.cos(angle_rad)
-        fy = self.length * math.sin(angle_rad)
-
-        px = -self.width / 2 * math.sin(angle_rad)
-        py = self.width / 2 * math.cos(angle_rad)
-
-        p1 = (self.pivot_x + px, self.pivot_y + py)
-        p2 = (self.pivot_x - px, self.pivot_y - py)
-        p3 = (self.pivot_x - px + fx, self.pivot_y - py + fy)
-        p4 = (self.pivot_x + px + fx, self.pivot_y + py + fy)
+        if self.angle != self._transform_angle:
+            self._update_transform()
+        return self.polygon
+
+    def drawn_angle(self, alpha=1.0):
+        # alpha < 1 giver vinklen mellem de to seneste fysiktrin
+        if alpha < 1.0:
+            return self.prev_angle + (self.angle - self.prev_angle) * alpha
+        return self.angle
+
+    def draw(self, screen, alpha=1.0):
+        if alpha < 1.0 and self.angle != self.prev_angle:
+            # Mellem de to seneste fysiktrin; regnes ud uden at røre cachen
+            _, _, end_x, end_y, flipper_points = self._geometry(self.drawn_angle(alpha))
+        else:
+            flipper_points = self.get_flipper_polygon_points()
+            end_x, end_y = self.end_x, self.end_y
+        rect = pygame.draw.polygon(screen, YELLOW, flipper_points)
 
-        return [p1, p2, p3, p4]
+        rect.union_ip(pygame.draw.circle(screen, YELLOW, (int(end_x), int(end_y)), self.width // 2))
 
-    def draw(self, screen):
-        flipper_points = self.get_flipper_polygon_points()
-        pygame.draw.polygon(screen, YELLOW, flipper_points)
+        rect.union_ip(pygame.draw.circle(screen, GRAY, (int(self.pivot_x), int(self.pivot_y)), 5))
+        return rect
 
-        end_x, end_y = self.get_end_point()
-        pygame.draw.circle(screen, YELLOW, (int(end_x), int(end_y)), self.width // 2)
-
-        pygame.draw.circle(screen, GRAY, (int(self.pivot_x), int(self.pivot_y)), 5)
+    def swept_through(self, ball):
+        # Ligger kuglens centrum i det område flipperen har fejet over siden frame-start
+        # (mellem start- og slutretningen og inden for rækkevidde af pivot)?
+        swing = self.angle - self.prev_angle
+        if swing == 0:
+            return False
+        bx = ball.x - self.pivot_x
+        by = ball.y - self.pivot_y
+        reach = self.length + ball.radius + self.width / 2
+        if bx * bx + by * by > reach * reach:
+            return False
+        direction = 1 if swing > 0 else -1
+        return (direction * (self.prev_cos * by - self.prev_sin * bx) >= 0
+                and direction * (bx * self.sin - by * self.cos) >= 0)
 
     def check_collision(self, ball, sound_manager=None): # Tilføj sound_manager
+        if self.angle != self._transform_angle:
+            self._update_transform()
         flipper_start_x, flipper_start_y = self.pivot_x, self.pivot_y
-        flipper_end_x, flipper_end_y = self.get_end_point()
 
         v_start_ball_x = ball.x - flipper_start_x
         v_start_ball_y = ball.y - flipper_start_y
 
-        v_flipper_x = flipper_end_x - flipper_start_x
-        v_flipper_y = flipper_end_y - flipper_start_y
+        v_flipper_x = self.end_x - flipper_start_x
+        v_flipper_y = self.end_y - flipper_start_y
 
         flipper_length_sq = v_flipper_x * v_flipper_x + v_flipper_y * v_flipper_y
         if flipper_length_sq == 0:
@@ -157,293 +383,989 @@ class Flipper:
         collision_threshold = ball.radius + self.width / 2
         if distance <= collision_threshold:
             if distance == 0:
-                ball.vx = random.uniform(-1, 1) * 5
-                ball.vy = random.uniform(-1, 1) * 5
+                ball.vx = self.rng.uniform(-1, 1) * 5
+                ball.vy = self.rng.uniform(-1, 1) * 5
                 if sound_manager:
-                    sound_manager.play_flipper_hit() # Afspil flipper lyd
+                    sound_manager.play_flipper_hit(ball.get_speed()) # Afspil flipper lyd
                 return True
-
             nx = dx / distance
             ny = dy / distance
+            swept = False
+        elif self.swept_through(ball):
+            # Flipperen er drejet forbi kuglen i løbet af framet: kuglen skubbes ud på
+            # forkanten (distance bliver negativ, da kuglen ligger bag flipperen)
+            direction = 1 if self.angular_velocity > 0 else -1
+            nx = -self.sin * direction
+            ny = self.cos * direction
+            distance = dx * nx + dy * ny
+            swept = True
+        else:
+            return False
 
-            dot_product = ball.vx * nx + ball.vy * ny
+        # Fladens fart i kontaktpunktet: vinkelhastighed gange armen vinkelret på flipperen
+        surface_vx = -self.angular_velocity * (closest_y - flipper_start_y)
+        surface_vy = self.angular_velocity * (closest_x - flipper_start_x)
+        relative_normal = (ball.vx - surface_vx) * nx + (ball.vy - surface_vy) * ny
 
-            if dot_product < 0:
-                ball.vx -= 2 * dot_product * nx
-                ball.vy -= 2 * dot_product * ny
+        if relative_normal < 0 or swept:
+            if relative_normal < 0:
+                impulse = (1 + FLIPPER_RESTITUTION) * relative_normal
+                ball.vx -= impulse * nx
+                ball.vy -= impulse * ny
 
-                if self.is_active:
-                    force_multiplier = 2.0
-                    ball.vx *= force_multiplier
-                    ball.vy *= force_multiplier
-                    ball.vy -= 6
-                
-                if sound_manager:
-                    sound_manager.play_flipper_hit() # Afspil flipper lyd
+            if sound_manager:
+                sound_manager.play_flipper_hit(-relative_normal) # Afspil flipper lyd
 
-                overlap = collision_threshold - distance
-                ball.x += nx * (overlap + 0.5)
-                ball.y += ny * (overlap + 0.5)
+            overlap = collision_threshold - distance
+            ball.x += nx * (overlap + 0.5)
+            ball.y += ny * (overlap + 0.5)
 
-                return True
+            return True
         return False
 
-class Wall:
-    def __init__(self, x1, y1, x2, y2):
-        self.x1 = x1
-        self.y1 = y1
-        self.x2 = x2
-        self.y2 = y2
-        self.wall_vec_x = self.x2 - self.x1
-        self.wall_vec_y = self.y2 - self.y1
-        self.normal_x = -self.wall_vec_y
-        self.normal_y = self.wall_vec_x
-        norm_mag = math.sqrt(self.normal_x**2 + self.normal_y**2)
-        if norm_mag != 0:
-            self.normal_x /= norm_mag
-            self.normal_y /= norm_mag
-        else:
-            self.normal_x = 0
-            self.normal_y = 0
-
-    def draw(self, screen):
-        pygame.draw.line(screen, LIGHT_GRAY, (self.x1, self.y1), (self.x2, self.y2), WALL_THICKNESS)
-
-    def check_collision(self, ball, sound_manager=None): # Tilføj sound_manager
-        wx = self.x2 - self.x1
-        wy = self.y2 - self.y1
-
-        bx_to_wall_start = ball.x - self.x1
-        by_to_wall_start = ball.y - self.y1
+    def time_of_impact(self, x0, y0, dx, dy, radius, from_angle):
+        # Swept test mod en roterende flipper: kuglen flyttes (dx, dy) mens flipperen
+        # drejer fra from_angle til self.angle. Returnerer første t i [0, 1] med kontakt.
+        reach = radius + self.width / 2
+        if math.hypot(x0 - self.pivot_x, y0 - self.pivot_y) > self.length + reach + math.hypot(dx, dy):
+            return None # Kuglen kan ikke nå flipperen i dette skridt
+        angle_diff = self.angle - from_angle
+        length_sq = self.length * self.length
+
+        def gap(t):
+            angle_rad = math.radians(from_angle + angle_diff * t)
+            fx = self.length * math.cos(angle_rad)
+            fy = self.length * math.sin(angle_rad)
+            bx = x0 + dx * t - self.pivot_x
+            by = y0 + dy * t - self.pivot_y
+            s = max(0, min(1, (bx * fx + by * fy) / length_sq))
+            return math.hypot(bx - s * fx, by - s * fy) - reach
+
+        if gap(0) <= 0:
+            return None # Allerede i kontakt
+        lo = 0.0
+        for i in range(1, FLIPPER_SWEEP_SAMPLES + 1):
+            hi = i / FLIPPER_SWEEP_SAMPLES
+            if gap(hi) <= 0:
+                for _ in range(8):
+                    mid = (lo + hi) / 2
+                    if gap(mid) <= 0:
+                        hi = mid
+                    else:
+                        lo = mid
+                return hi
+            lo = hi
+        return None
+
+def wall_collision(table, index, ball, sound_manager=None):
+    # Kollision mellem kuglen og væg nr. index i bordet. Geometrien (segmentvektor,
+    # 1/længde², normal) er regnet ud af bordcompileren og læses direkte fra kolonnerne.
+    inv_length_sq = table.inv_length_sq[index]
+    if inv_length_sq == 0:
+        return False
+    x1 = table.x1[index]
+    y1 = table.y1[index]
+    wx = table.wx[index]
+    wy = table.wy[index]
 
-        wall_length_sq = wx * wx + wy * wy
+    bx_to_wall_start = ball.x - x1
+    by_to_wall_start = ball.y - y1
 
-        if wall_length_sq == 0:
-            return False
+    t = max(0, min(1, (bx_to_wall_start * wx + by_to_wall_start * wy) * inv_length_sq))
 
-        t = max(0, min(1, (bx_to_wall_start * wx + by_to_wall_start * wy) / wall_length_sq))
+    closest_x = x1 + t * wx
+    closest_y = y1 + t * wy
 
-        closest_x = self.x1 + t * wx
-        closest_y = self.y1 + t * wy
+    dx_to_ball_center = ball.x - closest_x
+    dy_to_ball_center = ball.y - closest_y
 
-        dx_to_ball_center = ball.x - closest_x
-        dy_to_ball_center = ball.y - closest_y
+    distance = math.sqrt(dx_to_ball_center * dx_to_ball_center + dy_to_ball_center * dy_to_ball_center)
 
-        distance = math.sqrt(dx_to_ball_center * dx_to_ball_center + dy_to_ball_center * dy_to_ball_center)
+    collision_threshold = ball.radius + WALL_THICKNESS / 2
 
-        collision_threshold = ball.radius + WALL_THICKNESS / 2
+    if distance < collision_threshold:
+        if distance == 0:
+            nx = table.normal_x[index]
+            ny = table.normal_y[index]
+        else:
+            nx = dx_to_ball_center / distance
+            ny = dy_to_ball_center / distance
+
+        dot_product = ball.vx * nx + ball.vy * ny
+
+        ball.vx -= 2 * dot_product * nx
+        ball.vy -= 2 * dot_product * ny
+
+        ball.vx *= WALL_RESTITUTION
+        ball.vy *= WALL_RESTITUTION
+
+        overlap = collision_threshold - distance
+        ball.x += nx * (overlap + 0.2)
+        ball.y += ny * (overlap + 0.2)
+
+        if sound_manager:
+            sound_manager.play_wall_hit(abs(dot_product)) # Afspil væg lyd
+
+        return True
+
+    return False
+
+def wall_time_of_impact(table, index, x0, y0, dx, dy, radius):
+    # Swept test: kuglen flyttes (dx, dy) fra (x0, y0). Returnerer den brøkdel af
+    # bevægelsen hvor den rammer kapslen om væg nr. index, eller None.
+    reach = radius + WALL_THICKNESS / 2 - CONTACT_SKIN
+    x1 = table.x1[index]
+    y1 = table.y1[index]
+    inv_length_sq = table.inv_length_sq[index]
+    if inv_length_sq == 0:
+        return circle_time_of_impact(x0, y0, dx, dy, x1, y1, reach)
+    wx = table.wx[index]
+    wy = table.wy[index]
+    normal_x = table.normal_x[index]
+    normal_y = table.normal_y[index]
+
+    # Siden af kapslen: afstand langs normalen
+    dist = (x0 - x1) * normal_x + (y0 - y1) * normal_y
+    approach = dx * normal_x + dy * normal_y
+    best = None
+    if abs(dist) <= reach:
+        s = ((x0 - x1) * wx + (y0 - y1) * wy) * inv_length_sq
+        if 0 <= s <= 1:
+            return None # Allerede i kontakt
+    elif dist * approach < 0:
+        t = (abs(dist) - reach) / abs(approach)
+        if t <= 1:
+            s = ((x0 + dx * t - x1) * wx + (y0 + dy * t - y1) * wy) * inv_length_sq
+            if 0 <= s <= 1:
+                return t
+
+    # Enderne af kapslen
+    for cx, cy in ((x1, y1), (table.x2[index], table.y2[index])):
+        t = circle_time_of_impact(x0, y0, dx, dy, cx, cy, reach)
+        if t is not None and (best is None or t < best):
+            best = t
+    return best
+
+def draw_table_walls(screen, table):
+    for x1, y1, x2, y2 in zip(table.x1, table.y1, table.x2, table.y2):
+        pygame.draw.line(screen, LIGHT_GRAY, (x1, y1), (x2, y2), WALL_THICKNESS)
+
+class _Segment:
+    # Ét segment med de samme kolonner som table.Table, hver med én værdi
+    def __init__(self, x1, y1, x2, y2):
+        for field, value in zip(TABLE_FIELDS, segment_geometry(x1, y1, x2, y2)):
+            setattr(self, field, (value,))
+        self.count = 1
 
-        if distance < collision_threshold:
-            if distance == 0:
-                nx = self.normal_x
-                ny = self.normal_y
-            else:
-                nx = dx_to_ball_center / distance
-                ny = dy_to_ball_center / distance
+class Wall:
+    # En enkelt væg som objekt (benchmarks, pinball_env). Spillet selv opretter ingen
+    # Wall-objekter, men kalder wall_collision og wall_time_of_impact med bordet og indekset.
+    __slots__ = ("table", "index")
 
-            dot_product = ball.vx * nx + ball.vy * ny
+    def __init__(self, x1, y1, x2, y2):
+        self.table = _Segment(x1, y1, x2, y2)
+        self.index = 0
 
-            ball.vx -= 2 * dot_product * nx
-            ball.vy -= 2 * dot_product * ny
+    @classmethod
+    def from_table(cls, table, index):
+        wall = cls.__new__(cls)
+        wall.table = table
+        wall.index = index
+        return wall
 
-            ball.vx *= 0.8
-            ball.vy *= 0.8
+    def get_bounds(self):
+        table, index = self.table, self.index
+        half = WALL_THICKNESS / 2
+        return (table.min_x[index] - half, table.min_y[index] - half, table.max_x[index] + half, table.max_y[index] + half)
 
-            overlap = collision_threshold - distance
-            ball.x += nx * (overlap + 0.2)
-            ball.y += ny * (overlap + 0.2)
+    def draw(self, screen):
+        table, index = self.table, self.index
+        pygame.draw.line(screen, LIGHT_GRAY, (table.x1[index], table.y1[index]), (table.x2[index], table.y2[index]), WALL_THICKNESS)
 
-            if sound_manager:
-                sound_manager.play_wall_hit() # Afspil væg lyd
+    def check_collision(self, ball, sound_manager=None):
+        return wall_collision(self.table, self.index, ball, sound_manager)
 
-            return True
+    def time_of_impact(self, x0, y0, dx, dy, radius):
+        return wall_time_of_impact(self.table, self.index, x0, y0, dx, dy, radius)
 
-        return False
 
-class Collectible:
-    def __init__(self, x, y):
+class CollectiblePool:
+    # Samleobjekter i forhåndsallokerede arrays (x, y og en alive-maske) med en
+    # free-list over ledige pladser. Et samleobjekt er blot et pladsnummer, så
+    # opfyldning og fjernelse allokerer ingen objekter. Kollisionstesten er én
+    # gennemgang med kvadreret afstand; med NumPy og mange pladser i brug
+    # sker den vektoriseret over views direkte på de samme arrays.
+    def __init__(self, capacity=COLLECTIBLE_MAX_COUNT):
+        self.radius = COLLECTIBLE_RADIUS
+        self._allocate(capacity)
+        self.clear()
+
+    def _allocate(self, capacity):
+        old = getattr(self, "capacity", 0)
+        x = array("d", bytes(8 * capacity))
+        y = array("d", bytes(8 * capacity))
+        alive = bytearray(capacity)
+        if old:
+            x[:old] = self.x
+            y[:old] = self.y
+            alive[:old] = self.alive
+        self.capacity = capacity
         self.x = x
         self.y = y
-        self.radius = COLLECTIBLE_RADIUS
-        self.collected = False
+        self.alive = alive
+        self._x_view = None # NumPy-views bygges først når poolen er stor nok til at bruge dem
+
+    def _build_views(self):
+        # Views deler hukommelse med arrays ovenfor; scratch-bufferne genbruges hver test
+        self._x_view = np.frombuffer(self.x, dtype=np.float64)
+        self._y_view = np.frombuffer(self.y, dtype=np.float64)
+        self._alive_view = np.frombuffer(self.alive, dtype=np.bool_)
+        self._dx = np.empty(self.capacity)
+        self._dy = np.empty(self.capacity)
+        self._hit = np.empty(self.capacity, dtype=np.bool_)
+
+    def clear(self):
+        self.alive[:] = bytes(self.capacity)
+        self.free = list(range(self.capacity - 1, -1, -1)) # Laveste plads øverst, så de levende ligger samlet
+        self.count = 0
+        self.high_water = 0 # Alle levende pladser ligger under denne grænse
+
+    def __len__(self):
+        return self.count
+
+    def snapshot(self):
+        return (self.x[:], self.y[:], bytes(self.alive), self.free[:], self.count, self.high_water)
+
+    def restore(self, state):
+        x, y, alive, free, count, high_water = state
+        if len(x) == self.capacity:
+            # Samme størrelse: kopieres ind i de eksisterende buffere, så NumPy-views stadig gælder
+            self.x[:] = x
+            self.y[:] = y
+            self.alive[:] = alive
+        else:
+            self.capacity = len(x)
+            self.x = x[:]
+            self.y = y[:]
+            self.alive = bytearray(alive)
+            self._x_view = None
+        self.free = free[:]
+        self.count = count
+        self.high_water = high_water
+
+    def spawn(self, x, y):
+        if not self.free:
+            old = self.capacity
+            self._allocate(old * 2)
+            self.free.extend(range(self.capacity - 1, old - 1, -1))
+        slot = self.free.pop()
+        self.x[slot] = x
+        self.y[slot] = y
+        self.alive[slot] = 1
+        self.count += 1
+        if slot >= self.high_water:
+            self.high_water = slot + 1
+        return slot
+
+    def kill(self, slot):
+        if self.alive[slot]:
+            self.alive[slot] = 0
+            self.free.append(slot)
+            self.count -= 1
+
+    def collide(self, ball):
+        # Returnerer pladserne kuglen overlapper, samt hvor mange pladser der blev testet
+        reach = self.radius + ball.radius
+        reach_sq = reach * reach
+        n = self.high_water
+        if n >= COLLECTIBLE_VECTOR_MIN and _load_numpy():
+            if self._x_view is None:
+                self._build_views()
+            dx = np.subtract(self._x_view[:n], ball.x, out=self._dx[:n])
+            dy = np.subtract(self._y_view[:n], ball.y, out=self._dy[:n])
+            np.multiply(dx, dx, out=dx)
+            np.multiply(dy, dy, out=dy)
+            np.add(dx, dy, out=dx)
+            hit = np.less(dx, reach_sq, out=self._hit[:n])
+            np.logical_and(hit, self._alive_view[:n], out=hit)
+            return np.flatnonzero(hit).tolist(), self.count
+
+        xs, ys, alive = self.x, self.y, self.alive
+        bx, by = ball.x, ball.y
+        hits = []
+        for slot in range(n):
+            if alive[slot]:
+                dx = xs[slot] - bx
+                dy = ys[slot] - by
+                if dx * dx + dy * dy < reach_sq:
+                    hits.append(slot)
+        return hits, self.count
+
+    def blit_items(self, sprite, scale=1.0):
+        # (sprite, position) for hvert levende samleobjekt; sprite er centreret i sit rektangel
+        offset = sprite.get_width() // 2
+        xs, ys, alive = self.x, self.y, self.alive
+        if scale != 1.0:
+            return [(sprite, (int(xs[slot] * scale) - offset, int(ys[slot] * scale) - offset))
+                    for slot in range(self.high_water) if alive[slot]]
+        return [(sprite, (int(xs[slot]) - offset, int(ys[slot]) - offset))
+                for slot in range(self.high_water) if alive[slot]]
 
     def draw(self, screen):
-        if not self.collected:
-            pygame.draw.circle(screen, COLLECTIBLE_COLOR, (int(self.x), int(self.y)), self.radius)
-            # Add a small sparkle for visual appeal
-            pygame.draw.circle(screen, WHITE, (int(self.x + self.radius/2), int(self.y - self.radius/2)), self.radius // 3)
-
-
-    def check_collision(self, ball, sound_manager=None): # Tilføj sound_manager
-        if self.collected:
-            return False
-
-        distance = math.sqrt((self.x - ball.x)**2 + (self.y - ball.y)**2)
-        if distance < self.radius + ball.radius:
-            self.collected = True
-            if sound_manager:
-                sound_manager.play_collectible_pickup() # Afspil collectible lyd
-            return True
-        return False
+        rects = []
+        radius = self.radius
+        sparkle = radius // 3
+        xs, ys, alive = self.x, self.y, self.alive
+        for slot in range(self.high_water):
+            if alive[slot]:
+                x = int(xs[slot])
+                y = int(ys[slot])
+                rects.append(pygame.draw.circle(screen, COLLECTIBLE_COLOR, (x, y), radius))
+                # Add a small sparkle for visual appeal
+                pygame.draw.circle(screen, WHITE, (int(xs[slot] + radius / 2), int(ys[slot] - radius / 2)), sparkle)
+        return rects
 
 class SoundManager: # NY KLASSE TIL LYDHÅNDTERING
-    def __init__(self):
+    # Kollisionslyde lægges i kø under update og afspilles samlet én gang pr. frame
+    # (dispatch) på en fast pulje af mixer-kanaler. Hver lyd har en cooldown, målt i
+    # fysiktrin så den ikke afhænger af tegnede frames pr. sekund, og et
+    # maks antal samtidige stemmer, og er puljen fuld, stjæles kanalen fra den
+    # stemme med lavest prioritet (ældste først). Lydstyrken skaleres med stødets fart.
+
+    # Sørg for at disse filer findes i samme mappe som scriptet
+    # navn: (fil, lydstyrke, prioritet, cooldown i fysiktrin ved PHYSICS_BASE_HZ, maks samtidige stemmer)
+    SOUND_FILES = {
+        "flipper_hit_sound": ("flipper_hit.mp3", 0.5, 1, 4, 2), # Eks: Kort "pop" eller "thwack"
+        "wall_hit_sound": ("wall_hit.mp3", 0.3, 0, 6, 2), # Eks: Blødere "thud"
+        "ball_lost_sound": ("lost_ball_hit.mp3", 0.7, 3, 0, 1), # Eks: Dyb "boing" eller "splat"
+        "collectible_pickup_sound": ("punch_hit.mp3", 0.4, 2, 0, 3), # Eks: "Ding" eller "chime"
+    }
+    MUSIC_FILE = "background_music.mp3" # Eks: .mp3 eller .ogg fil
+
+    def __init__(self, voices=SOUND_VOICES):
+        # voices=0 giver en stum manager uden mixer (headless)
         self.flipper_hit_sound = None
         self.wall_hit_sound = None
         self.ball_lost_sound = None
         self.collectible_pickup_sound = None
         self.background_music = None
-
-        self._load_sounds()
+        self.music_enabled = True
+        # Lydene indlæses i baggrunden af PinballGame; indtil da er de None og afspilles ikke
+
+        self.pending = {} # navn -> største stødfart i denne frame
+        self.last_played = {name: -10**9 for name in self.SOUND_FILES} # self.time ved seneste afspilning
+        self.time = 0.0 # Fysiktid i trin ved PHYSICS_BASE_HZ; tælles frem af advance()
+        self.played = 0
+        self.dropped = 0
+        self.channels = []
+        if voices:
+            try:
+                pygame.mixer.set_num_channels(voices)
+                self.channels = [pygame.mixer.Channel(i) for i in range(voices)]
+            except pygame.error as e:
+                print(f"Kunne ikke oprette lydkanaler: {e}")
+        self.voices = [None] * len(self.channels) # (navn, prioritet, starttid) pr. kanal
+
+    def set_sound(self, name, sound):
+        sound.set_volume(self.SOUND_FILES[name][1]) # Juster lydstyrken efter behov
+        setattr(self, name, sound)
+
+    def set_music(self, path):
+        # Filen er allerede åbnet med pygame.mixer.music.load i indlæsningstråden
+        self.background_music = path
+        pygame.mixer.music.set_volume(0.2) # Baggrundsmusik skal være lavere
         self._play_music()
 
-    def _load_sounds(self):
-        try:
-            # Sørg for at disse filer findes i samme mappe som scriptet
-            # Du skal erstatte 'path_to_sound.wav' med de faktiske filnavne
-            self.flipper_hit_sound = pygame.mixer.Sound("flipper_hit.mp3") # Eks: Kort "pop" eller "thwack"
-            self.wall_hit_sound = pygame.mixer.Sound("wall_hit.mp3")     # Eks: Blødere "thud"
-            self.ball_lost_sound = pygame.mixer.Sound("lost_ball_hit.mp3")   # Eks: Dyb "boing" eller "splat"
-            self.collectible_pickup_sound = pygame.mixer.Sound("punch_hit.mp3") # Eks: "Ding" eller "chime"
-
-            # Juster lydstyrken efter behov
-            self.flipper_hit_sound.set_volume(0.5)
-            self.wall_hit_sound.set_volume(0.3)
-            self.ball_lost_sound.set_volume(0.7)
-            self.collectible_pickup_sound.set_volume(0.4)
-
-        except pygame.error as e:
-            print(f"Kunne ikke indlæse lyde: {e}")
-            # Fortsæt uden lyde, hvis de ikke kan indlæses
+    def _play_music(self):
+        if self.background_music and self.music_enabled:
+            pygame.mixer.music.play(-1) # -1 gør at musikken looper uendeligt
 
+    def set_voices(self, voices):
+        # Kvalitetsniveauet bestemmer hvor mange lyde der kan spille på én gang
+        if not self.channels:
+            return # Ingen mixer
         try:
-            self.background_music = "background_music.mp3" # Eks: .mp3 eller .ogg fil
-            pygame.mixer.music.load(self.background_music)
-            pygame.mixer.music.set_volume(0.2) # Baggrundsmusik skal være lavere
+            pygame.mixer.set_num_channels(voices)
         except pygame.error as e:
-            print(f"Kunne ikke indlæse baggrundsmusik: {e}")
-            self.background_music = None
+            print(f"Kunne ikke ændre antal lydkanaler: {e}")
+            return
+        self.channels = [pygame.mixer.Channel(i) for i in range(voices)]
+        self.voices = (self.voices + [None] * voices)[:voices]
 
-    def _play_music(self):
-        if self.background_music:
-            pygame.mixer.music.play(-1) # -1 gør at musikken looper uendeligt
+    def set_music_enabled(self, enabled):
+        if enabled == self.music_enabled:
+            return
+        self.music_enabled = enabled
+        if not self.background_music:
+            return
+        if enabled:
+            self._play_music()
+        else:
+            pygame.mixer.music.stop()
 
-    def play_flipper_hit(self):
-        if self.flipper_hit_sound:
-            self.flipper_hit_sound.play()
+    def _queue(self, name, impact):
+        # Svage berøringer (en kugle der ruller langs en væg) giver ingen lyd
+        if impact >= SOUND_MIN_IMPACT and impact > self.pending.get(name, 0.0):
+            self.pending[name] = impact
 
-    def play_wall_hit(self):
-        if self.wall_hit_sound:
-            self.wall_hit_sound.play()
+    def play_flipper_hit(self, impact=SOUND_FULL_VOLUME_SPEED):
+        self._queue("flipper_hit_sound", impact)
 
-    def play_ball_lost(self):
-        if self.ball_lost_sound:
-            self.ball_lost_sound.play()
+    def play_wall_hit(self, impact=SOUND_FULL_VOLUME_SPEED):
+        self._queue("wall_hit_sound", impact)
 
-    def play_collectible_pickup(self):
-        if self.collectible_pickup_sound:
-            self.collectible_pickup_sound.play()
+    def play_ball_lost(self, impact=SOUND_FULL_VOLUME_SPEED):
+        self._queue("ball_lost_sound", impact)
 
+    def play_collectible_pickup(self, impact=SOUND_FULL_VOLUME_SPEED):
+        self._queue("collectible_pickup_sound", impact)
 
-class PinballGame:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Pinball Simulator")
-        self.clock = pygame.time.Clock()
-        self.font = pygame.font.Font(None, 36)
-        self.large_font = pygame.font.Font(None, 72) # Til Game Over skærm
+    def advance(self, dt):
+        # Kaldes én gang pr. fysiktrin
+        self.time += dt
 
-        try:
-            self.background_image = pygame.image.load("pinball.png").convert()
-            self.background_image = pygame.transform.scale(self.background_image, (SCREEN_WIDTH, SCREEN_HEIGHT))
-        except pygame.error as e:
-            print(f"Kunne ikke indlæse baggrundsbillede: {e}")
-            self.background_image = None
-        
-        self.sound_manager = SoundManager() # Opret SoundManager instansen
+    def dispatch(self):
+        if not self.pending:
+            return
+        # Højeste prioritet først, så den ikke selv bliver stjålet af en svagere lyd i samme frame
+        for name in sorted(self.pending, key=lambda name: -self.SOUND_FILES[name][2]):
+            self._start_voice(name, self.pending[name])
+        self.pending.clear()
+
+    def _start_voice(self, name, impact):
+        sound = getattr(self, name)
+        _, volume, priority, cooldown, max_voices = self.SOUND_FILES[name]
+        if sound is None or not self.channels or self.time - self.last_played[name] < cooldown:
+            return
+
+        free = None
+        victim = None
+        playing = 0
+        for index, channel in enumerate(self.channels):
+            voice = self.voices[index]
+            if voice is None or not channel.get_busy():
+                self.voices[index] = None
+                if free is None:
+                    free = index
+                continue
+            if voice[0] == name:
+                playing += 1
+            if voice[1] < priority and (victim is None or (voice[1], voice[2]) < (self.voices[victim][1], self.voices[victim][2])):
+                victim = index
+
+        index = free if free is not None else victim
+        if playing >= max_voices or index is None:
+            self.dropped += 1
+            return
+
+        channel = self.channels[index]
+        channel.play(sound)
+        channel.set_volume(min(1.0, impact / SOUND_FULL_VOLUME_SPEED)) # Ganges med lydens egen lydstyrke
+        self.voices[index] = (name, priority, self.time)
+        self.last_played[name] = self.time
+        self.played += 1
+
+
+class TextCache:
+    # LRU-cache af renderede tekster nøglet på (font, tekst, farve). misses tæller
+    # hvor mange gange fonten faktisk har rasteriseret en tekst.
+    def __init__(self, max_entries=TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+
+class SpriteCache:
+    # Forhåndstegnede sprites: kugle og samleobjekt én gang, flipperen pr. vinkel afrundet
+    # til FLIPPER_SPRITE_STEP. Alle dynamiske objekter kan så tegnes med ét Surface.blits-kald.
+    # Med scale < 1 tegnes spritesne i fuld størrelse og skaleres ned til en mindre tegneflade.
+    # Kræver at skærmen er oprettet (convert).
+    def __init__(self, flipper_step=FLIPPER_SPRITE_STEP, scale=1.0, sparkle=True):
+        self.flipper_step = flipper_step
+        self.scale = scale
+        self.ball = self._circle_sprite(BALL_RADIUS, RED, (-3, -3), 3)
+        self.ball_offset = self.ball.get_width() // 2
+        self.collectible = self._circle_sprite(COLLECTIBLE_RADIUS, COLLECTIBLE_COLOR,
+                                               (COLLECTIBLE_RADIUS // 2, -(COLLECTIBLE_RADIUS // 2)),
+                                               COLLECTIBLE_RADIUS // 3 if sparkle else 0)
+        self.flippers = {} # (længde, bredde, vinkeltrin) -> (sprite, dx, dy) i forhold til pivot
+        self.misses = 0
+
+    @staticmethod
+    def _canvas(width, height):
+        canvas = pygame.Surface((width, height)).convert()
+        canvas.fill(SPRITE_COLORKEY)
+        return canvas
+
+    def _finish(self, sprite):
+        if self.scale != 1.0:
+            # Nærmeste nabo, så kanten ikke blandes med colorkey-farven
+            width, height = sprite.get_size()
+            sprite = pygame.transform.scale(sprite, (max(1, round(width * self.scale)), max(1, round(height * self.scale))))
+        sprite.set_colorkey(SPRITE_COLORKEY, pygame.RLEACCEL)
+        return sprite
+
+    def _circle_sprite(self, radius, color, highlight, highlight_radius):
+        # Samme pixels som pygame.draw.circle med centrum i (radius, radius) plus et hvidt glimt
+        sprite = self._canvas(2 * radius + 1, 2 * radius + 1)
+        pygame.draw.circle(sprite, color, (radius, radius), radius)
+        if highlight_radius:
+            pygame.draw.circle(sprite, WHITE, (radius + highlight[0], radius + highlight[1]), highlight_radius)
+        return self._finish(sprite)
+
+    def ball_item(self, ball, alpha=1.0):
+        x, y = ball.drawn_position(alpha)
+        if self.scale != 1.0:
+            x *= self.scale
+            y *= self.scale
+        return self.ball, (int(x) - self.ball_offset, int(y) - self.ball_offset)
+
+    def flipper_item(self, flipper, alpha=1.0):
+        step = round(flipper.drawn_angle(alpha) / self.flipper_step)
+        key = (flipper.length, flipper.width, step)
+        entry = self.flippers.get(key)
+        if entry is None:
+            entry = self.flippers[key] = self._render_flipper(flipper, step * self.flipper_step)
+        sprite, dx, dy = entry
+        return sprite, (int(flipper.pivot_x * self.scale) + dx, int(flipper.pivot_y * self.scale) + dy)
+
+    def _render_flipper(self, flipper, angle):
+        # Tegnes som Flipper.draw med pivot i midten af en gennemsigtig surface og beskæres bagefter
+        self.misses += 1
+        extent = int(flipper.length + flipper.width) + 2
+        canvas = self._canvas(2 * extent + 1, 2 * extent + 1)
+        ox = extent - int(flipper.pivot_x)
+        oy = extent - int(flipper.pivot_y)
+        _, _, end_x, end_y, polygon = flipper._geometry(angle)
+        pygame.draw.polygon(canvas, YELLOW, [(x + ox, y + oy) for x, y in polygon])
+        pygame.draw.circle(canvas, YELLOW, (int(end_x) + ox, int(end_y) + oy), flipper.width // 2)
+        pygame.draw.circle(canvas, GRAY, (extent, extent), 5)
+        canvas.set_colorkey(SPRITE_COLORKEY)
+        bounds = canvas.get_bounding_rect()
+        scale = self.scale
+        return (self._finish(canvas.subsurface(bounds).copy()),
+                round((bounds.x - extent) * scale), round((bounds.y - extent) * scale))
+
+
+class QualityGovernor:
+    # Følger arbejdstiden pr. frame (input, fysik og tegning, uden ventetid på clock og vsync)
+    # som et glidende gennemsnit og skifter kvalitetsniveau med hysterese: et niveau ned
+    # når gennemsnittet har ligget over QUALITY_BUDGET_DOWN af budgettet i QUALITY_DOWN_FRAMES
+    # frames, et niveau op når det har ligget under QUALITY_BUDGET_UP i up_frames frames.
+    # Må et skift op trækkes tilbage før næste skift op kunne komme, fordobles up_frames.
+    def __init__(self, fps, level=0):
+        self.budget_ms = 1000.0 / (fps or FPS)
+        self.level = level # Indeks i QUALITY_LEVELS
+        self.average_ms = 0.0
+        self.over = 0
+        self.under = 0
+        self.up_frames = QUALITY_UP_FRAMES
+        self.since_up = None # Frames siden seneste skift op
+        self.changes = 0
+
+    def frame(self, work_ms):
+        # Returnerer det nye niveau når der skal skiftes, ellers None
+        self.average_ms += (work_ms - self.average_ms) * QUALITY_SMOOTHING
+        if self.since_up is not None:
+            self.since_up += 1
+        if self.average_ms > self.budget_ms * QUALITY_BUDGET_DOWN:
+            self.over += 1
+            self.under = 0
+        elif self.average_ms < self.budget_ms * QUALITY_BUDGET_UP:
+            self.under += 1
+            self.over = 0
+        else:
+            self.over = self.under = 0
+
+        if self.over >= QUALITY_DOWN_FRAMES and self.level < len(QUALITY_LEVELS) - 1:
+            if self.since_up is not None and self.since_up < self.up_frames:
+                self.up_frames = min(self.up_frames * 2, QUALITY_UP_MAX_FRAMES)
+            self.since_up = None
+            return self._switch(self.level + 1)
+        if self.under >= self.up_frames and self.level > 0:
+            self.since_up = 0
+            return self._switch(self.level - 1)
+        return None
+
+    def _switch(self, level):
+        self.level = level
+        self.over = self.under = 0
+        self.changes += 1
+        return level
+
+
+class FrameProfiler:
+    # Måler hver fase i run-løkken og hele framen. Tiderne (ms) skrives i faste
+    # arrays: en ringbuffer med de seneste frames og et histogram for hele
+    # sessionen, så målingen ikke allokerer noget pr. frame.
+    def __init__(self, history=PROFILE_HISTORY):
+        self.history = history
+        columns = len(PROFILE_PHASES) + 1 # Sidste kolonne er hele framen
+        self.samples = [array("d", bytes(8 * history)) for _ in range(columns)]
+        self.histograms = [array("q", bytes(8 * PROFILE_BINS)) for _ in range(columns)]
+        self.index = 0
+        self.frames = 0
+        self.frame_start = self.last = time.perf_counter()
+
+        self.font = pygame.font.Font(None, 22)
+        self.panel = pygame.Surface((300, 80 + 18 * columns), pygame.SRCALPHA)
+        self.panel_age = PROFILE_OVERLAY_REFRESH
+
+    def _store(self, column, ms):
+        self.samples[column][self.index] = ms
+        bin_index = int(ms / PROFILE_BIN_MS)
+        self.histograms[column][bin_index if bin_index < PROFILE_BINS else PROFILE_BINS - 1] += 1
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self._store(phase, (now - self.last) * 1000.0)
+        self.last = now
+
+    def end_frame(self):
+        self._store(len(PROFILE_PHASES), (self.last - self.frame_start) * 1000.0)
+        self.frame_start = self.last
+        self.index = (self.index + 1) % self.history
+        self.frames += 1
+
+    def percentiles(self, column, points=(50, 95, 99)):
+        count = min(self.frames, self.history)
+        if count == 0:
+            return [0.0] * len(points)
+        values = sorted(self.samples[column][:count])
+        return [values[min(count - 1, count * point // 100)] for point in points]
+
+    def _build_panel(self):
+        panel = self.panel
+        panel.fill((0, 0, 0, 170))
+        # Tallene højrestilles i hver sin kolonne, da fonten ikke er monospace
+        columns = (140, 210, 280)
+        panel.blit(self.font.render("ms", True, WHITE), (8, 6))
+        for x, label in zip(columns, ("p50", "p95", "p99")):
+            text = self.font.render(label, True, WHITE)
+            panel.blit(text, (x - text.get_width(), 6))
+        for row, name in enumerate(PROFILE_PHASES + ("frame",)):
+            color = YELLOW if name == "frame" else WHITE
+            y = 24 + 18 * row
+            panel.blit(self.font.render(name, True, color), (8, y))
+            for x, value in zip(columns, self.percentiles(row)):
+                text = self.font.render(f"{value:.2f}", True, color)
+                panel.blit(text, (x - text.get_width(), y))
+
+        # Frametid-graf for ringbufferen, ældste frame til venstre. Skala: 0 til 2 frames ved FPS
+        top = panel.get_height() - 56
+        width = panel.get_width() - 16
+        scale = 48 / (2000.0 / FPS)
+        budget_y = top + 48 - int(1000.0 / FPS * scale)
+        pygame.draw.line(panel, GREEN, (8, budget_y), (8 + width, budget_y))
+        count = min(self.frames, self.history)
+        if count > 1:
+            frame_times = self.samples[len(PROFILE_PHASES)]
+            oldest = self.index - count
+            points = [(8 + i * width // (count - 1), top + 48 - int(min(frame_times[(oldest + i) % self.history] * scale, 48)))
+                      for i in range(count)]
+            pygame.draw.lines(panel, RED, False, points)
+
+    def draw(self, screen):
+        # Panelet genopbygges kun hver PROFILE_OVERLAY_REFRESH frames; ellers er det én blit
+        self.panel_age += 1
+        if self.panel_age >= PROFILE_OVERLAY_REFRESH:
+            self.panel_age = 0
+            self._build_panel()
+        return screen.blit(self.panel, (SCREEN_WIDTH - self.panel.get_width() - 10, 50))
+
+    def export_csv(self, path):
+        with open(path, "w") as f:
+            f.write("bin_from_ms,bin_to_ms," + ",".join(PROFILE_PHASES) + ",frame\n")
+            for bin_index in range(PROFILE_BINS):
+                counts = ",".join(str(histogram[bin_index]) for histogram in self.histograms)
+                upper = f"{(bin_index + 1) * PROFILE_BIN_MS:g}" if bin_index < PROFILE_BINS - 1 else "inf"
+                f.write(f"{bin_index * PROFILE_BIN_MS:g},{upper},{counts}\n")
+
+
+class SpatialHash:
+    # Uniformt grid af celler over bordets vægge (table.WallGrid). Hver væg ligger som
+    # sit indeks i bordet i alle celler dens bounding box dækker, og en forespørgsel
+    # returnerer indeksene i stigende orden, så kollisionerne løses i samme rækkefølge
+    # som ved en fuld gennemgang. Griddet fra den kompilerede bordfil bruges direkte,
+    # når det er lavet med samme cellestørrelse og margin.
+    def __init__(self, cell_size=BROADPHASE_CELL_SIZE):
+        self.cell_size = cell_size
+        self.clear()
+
+    def build(self, table, margin=0.0):
+        grid = table.grid
+        if grid.cell_size != self.cell_size or grid.margin != margin:
+            grid = build_grid(table.min_x, table.min_y, table.max_x, table.max_y, self.cell_size, margin)
+        self.cx0, self.cy0, self.nx, self.ny = grid.cx0, grid.cy0, grid.nx, grid.ny
+        self.offsets = grid.offsets
+        self.indices = grid.indices
+
+    def clear(self):
+        self.cx0 = self.cy0 = self.nx = self.ny = 0
+        self.offsets = (0,)
+        self.indices = ()
+
+    def query(self, min_x, min_y, max_x, max_y):
+        size = self.cell_size
+        cx0, cy0 = self.cx0, self.cy0
+        offsets = self.offsets
+        found = None
+        merged = False
+        cy_range = range(max(int(min_y // size), cy0), min(int(max_y // size) + 1, cy0 + self.ny))
+        for cx in range(max(int(min_x // size), cx0), min(int(max_x // size) + 1, cx0 + self.nx)):
+            row = (cx - cx0) * self.ny - cy0
+            for cy in cy_range:
+                start = offsets[row + cy]
+                end = offsets[row + cy + 1]
+                if start == end:
+                    continue
+                if found is None:
+                    found = self.indices[start:end]
+                else:
+                    if not merged:
+                        found = set(found)
+                        merged = True
+                    found.update(self.indices[start:end])
+        if found is None:
+            return ()
+        return sorted(found) if merged else found
+
+
+def create_table_walls(path=DEFAULT_TABLE, cache=None):
+    # Bordet indlæses fra en bordfil (se table.py); rækkefølgen i filen er den rækkefølge væggene testes i
+    table = load_table(path, cache)
+    return [Wall.from_table(table, index) for index in range(table.count)]
 
 
+class PinballGame:
+    def __init__(self, narrowphase_log=None, render_mode="full", seed=None, record_path=None, start_balls=1,
+                 profile=False, profile_csv=None, asset_cache=ASSET_CACHE_DIR,
+                 table=DEFAULT_TABLE, frenzy=None, physics_hz=PHYSICS_HZ, fps=FPS, vsync=False,
+                 max_catchup=MAX_CATCHUP_STEPS, headless=False, capture=None, quality="auto"):
+        # headless: ingen pygame, intet vindue, ingen lyd, ingen assets og intet leaderboard.
+        # Kun fysikken (handle_input/update) kan bruges.
+        self.headless = headless
+        self.screen = None
+        self.window = None
+        self.clock = None
+        if not headless:
+            init_pygame()
+            if vsync:
+                # vsync kræver en skaleret eller OpenGL-skærm i pygame 2
+                try:
+                    self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SCALED, vsync=1)
+                except pygame.error as e:
+                    print(f"vsync er ikke tilgængelig ({e}), kører uden")
+            if self.screen is None:
+                self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            self.window = self.screen # Med en tegneskala under 1 er self.screen en mindre surface der skaleres op til vinduet
+            pygame.display.set_caption("Pinball Simulator")
+            self.clock = pygame.time.Clock()
+        self.fps = fps # Loft over tegnede frames pr. sekund (0: ubegrænset)
+
+        # Fysikken kører med faste trin; run() tegner mellem de to seneste trin med self.alpha
+        self.physics_hz = physics_hz
+        self.step_dt = PHYSICS_BASE_HZ / physics_hz
+        self.max_catchup = max_catchup
+        self.alpha = 1.0
+        self.text_cache = TextCache()
+
+        # Baggrund og lyde indlæses i en baggrundstråd (se load_assets); indtil de er klar
+        # tegnes en ensfarvet baggrund, og spillet er stille
+        self.background_image = None
+        self.sound_manager = SoundManager(0 if headless else SOUND_VOICES) # Opret SoundManager instansen
+        self.asset_cache = AssetCache(asset_cache) if asset_cache else None # Bruges også til kompilerede bordfiler
+        self.asset_loader = None
+        self.table_path = table
+
+        # Kvalitetsniveau (se QUALITY_LEVELS): "auto" lader QualityGovernor vælge ud fra frametiden
+        self.quality = None
+        self.render_scale = 1.0
+        self.use_background = True
+        self.governor = QualityGovernor(fps) if quality == "auto" and not headless else None
+
+        # "full" tegner og flipper hele skærmen, "dirty" opdaterer kun de ændrede områder
+        self.render_mode = render_mode
+        self.dirty_rects = []
+        self.full_redraw = True
+
+        # Al tilfældighed i spillet kommer fra self.rng, så et seed gentager en session præcist
+        self.seed = seed if seed is not None else random.randrange(2**63)
+        self.rng = random.Random(self.seed)
+        self.record_path = record_path
+        self.recorder = None # Oprettes når bordet er indlæst, så optagelsen kan bære bordets fingeraftryk
+
+        self.continuous_collision = True # Swept kollision og substeps for hurtige kugler
+        self.multiball_balls = MULTIBALL_BALLS
+        self.start_balls = start_balls # Kugler i spil fra start (stresstest af multiball)
+
+        # Broadphase: væggene ligger i en spatial hash, samleobjekterne i en pool med arrays
+        self.wall_grid = SpatialHash()
+        self.frenzy = frenzy # Antal samleobjekter pr. opfyldning i bonus frenzy (None: normalt spil)
+        self.collectibles = CollectiblePool(max(COLLECTIBLE_MAX_COUNT, frenzy or 0))
+        self.wall_checks = 0 # Narrow-phase tests i seneste fysiktrin
+        self.collectible_checks = 0
+        self.narrowphase_log = open(narrowphase_log, "w") if narrowphase_log else None
+        if self.narrowphase_log:
+            self.narrowphase_log.write("frame,wall_checks,collectible_checks\n")
+        self.frame_count = 0 # Fysiktrin kørt
+
+        # Fasetider i run-løkken; F3 slår overlayet til og fra
+        self.profile_csv = profile_csv
+        self.profiler = FrameProfiler() if (profile or profile_csv) and not headless else None
+        self.show_profiler = self.profiler is not None
+
+        # Videooptagelse: hver tegnet frame kopieres fra skærmens buffer til en skrivetråd
+        self.capture = None
+        if capture and not headless:
+            from capture import FrameCapture
+            try:
+                self.capture = FrameCapture(capture, self.window)
+            except (OSError, ValueError) as e:
+                print(f"Kan ikke optage video: {e}")
+
+        # Resultaterne skrives af leaderboardets egen tråd; opstarten læser kun indekset
+        if headless:
+            self.leaderboard = None
+        else:
+            from leaderboard import Leaderboard # json og tråde skal ikke med i en headless opstart
+            self.leaderboard = Leaderboard()
         self.highscore = self.load_highscore()
         self.game_over = False
         self.reset_game()
         self.create_walls()
+        if record_path:
+            self.recorder = InputRecorder(self.seed, physics_hz, start_balls, frenzy, table, table_digest(self.table))
+        if not headless:
+            self.set_quality(next(iter(QUALITY_LEVELS)) if quality == "auto" else quality)
         # self.create_collectibles() # Kaldes i reset_game nu
 
+    def load_assets(self, wait=False):
+        # Starter indlæsningen første gang; med wait=True blokeres der til alt er installeret
+        if self.asset_loader is None:
+            from assets import AssetLoader, load_scaled_image, load_sound # Tråden skal ikke med i en headless opstart
+            jobs = [("background", load_scaled_image, ("pinball.png", (SCREEN_WIDTH, SCREEN_HEIGHT), self.asset_cache))]
+            for name, (path, *_) in SoundManager.SOUND_FILES.items():
+                jobs.append((name, load_sound, (path, self.asset_cache)))
+            jobs.append(("music", self._open_music, (SoundManager.MUSIC_FILE,)))
+            self.asset_loader = AssetLoader()
+            self.asset_loader.start(jobs)
+        if wait:
+            self.asset_loader.wait()
+        self.install_assets()
+
+    @staticmethod
+    def _open_music(path):
+        pygame.mixer.music.load(path) # Musikken streames; der er intet at cache
+        return path
+
+    def install_assets(self):
+        # Kaldes i hovedtråden hver frame og tager de assets i brug der er blevet færdige
+        for name, value, error in self.asset_loader.poll():
+            if name == "background":
+                if error:
+                    print(f"Kunne ikke indlæse baggrundsbillede: {error}")
+                else:
+                    self.background_image = value.convert()
+                    self.build_static_layer()
+            elif name == "music":
+                if error:
+                    print(f"Kunne ikke indlæse baggrundsmusik: {error}")
+                else:
+                    self.sound_manager.set_music(value)
+            elif error:
+                print(f"Kunne ikke indlæse lyde: {error}")
+                # Fortsæt uden lyden, hvis den ikke kan indlæses
+            else:
+                self.sound_manager.set_sound(name, value)
+
     def load_highscore(self):
-        if os.path.exists("highscore.txt"):
-            with open("highscore.txt", "r") as f:
-                try:
-                    return int(f.read())
-                except ValueError:
-                    return 0 # Filen er tom eller indeholder ugyldig data
-        return 0
+        return self.leaderboard.best() if self.leaderboard else 0
 
     def save_highscore(self):
-        with open("highscore.txt", "w") as f:
-            f.write(str(self.highscore))
-
-    def reset_game(self):
+        # Blokerer ikke: scoren lægges i kø til leaderboardets skrivetråd
+        if self.leaderboard:
+            self.leaderboard.submit(self.score, self.seed)
+
+    def reset_game(self, seed=None):
+        if seed is not None:
+            self.seed = seed
+            self.rng = random.Random(seed)
         self.score = 0
         self.balls_left = 5 # Antal kugler pr. spil
+        # Journalen fra sidste kørsel flettes ind i baggrunden og kan have hævet highscoren
+        self.highscore = max(self.highscore, self.load_highscore())
         self.last_extra_ball_score_threshold = 0 # Nulstil tærskel for ekstrabold
         self.game_over = False
+        self.full_redraw = True
+        self.balls = []
+        self.balls_lost = 0 # Antal kugler der er røget ud, også under multiball
+        self.stuck_respawns = 0 # Fastsiddende kugler erstattet (automatisk eller med R)
         self._spawn_new_ball()
 
-        self.left_flipper = Flipper(SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT - 120, True)
-        self.right_flipper = Flipper(SCREEN_WIDTH // 2 + 100, SCREEN_HEIGHT - 120, False)
+        self.left_flipper = Flipper(SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT - 120, True, self.rng)
+        self.right_flipper = Flipper(SCREEN_WIDTH // 2 + 100, SCREEN_HEIGHT - 120, False, self.rng)
         
         # Sørg for at samleobjekter også nulstilles/genoprettes
         self.create_collectibles()
 
+        if self.start_balls > 1:
+            self.start_multiball(self.start_balls - 1)
 
     def _spawn_new_ball(self):
         # Spawns ball higher up to allow it to fall into place
-        start_x = random.randint(SCREEN_WIDTH // 2 - 50, SCREEN_WIDTH // 2 + 50)
-        self.ball = Ball(start_x, 175)
+        start_x = self.rng.randint(SCREEN_WIDTH // 2 - 50, SCREEN_WIDTH // 2 + 50)
+        self.balls.append(Ball(start_x, 175, self.rng))
+
+    def start_multiball(self, count):
+        # Ekstra kugler sendes ind spredt over den øverste del af banen
+        for _ in range(count):
+            x = self.rng.uniform(200, SCREEN_WIDTH - 200)
+            y = self.rng.uniform(150, SCREEN_HEIGHT - 350)
+            self.balls.append(Ball(x, y, self.rng))
+
+    def snapshot(self):
+        # Hele spiltilstanden som en tuple af tal, arrays og rng'ens tilstand. Rører hverken
+        # tegning eller lyd, så en søgning kan prøve flere inputs fra samme øjeblik med restore()
+        return (self.score, self.balls_left, self.last_extra_ball_score_threshold, self.game_over,
+                self.balls_lost, self.stuck_respawns, self.seed, [ball.get_state() for ball in self.balls],
+                self.left_flipper.get_state(), self.right_flipper.get_state(),
+                self.collectibles.snapshot(), self.rng.getstate())
+
+    def restore(self, snapshot):
+        (self.score, self.balls_left, self.last_extra_ball_score_threshold, self.game_over,
+         self.balls_lost, self.stuck_respawns, self.seed, balls, left, right, collectibles, rng_state) = snapshot
+        self.balls = [Ball.from_state(state) for state in balls]
+        self.left_flipper.set_state(left)
+        self.right_flipper.set_state(right)
+        self.collectibles.restore(collectibles)
+        self.rng.setstate(rng_state) # Samme objekt, da flipperne også trækker fra det
+        self.full_redraw = True
 
     def create_walls(self):
-        self.walls = []
-
-        # Outer Left Wall
-        self.walls.append(Wall(170, 230, 170, SCREEN_HEIGHT - 280))
-
-        # Outer Right Wall
-        self.walls.append(Wall(SCREEN_WIDTH - 170, 230, SCREEN_WIDTH - 170, SCREEN_HEIGHT - 280))
-
-        # Top Wall (extended)
-        self.walls.append(Wall(170, 100, SCREEN_WIDTH - 170, 100)) # Extended
-
-        # Left Angled Wall (leading to flipper area)
-        self.walls.append(Wall(170, SCREEN_HEIGHT - 280, SCREEN_WIDTH // 2 - 130, SCREEN_HEIGHT - 130))
-
-        # Right Angled Wall (leading to flipper area)
-        self.walls.append(Wall(SCREEN_WIDTH // 2 + 130, SCREEN_HEIGHT - 130, SCREEN_WIDTH - 170, SCREEN_HEIGHT - 280))
-
-        # Left Flipper Gutter Wall (short inner wall near flipper)
-        self.walls.append(Wall(SCREEN_WIDTH // 2 - 130, SCREEN_HEIGHT - 130, SCREEN_WIDTH // 2 - 90, SCREEN_HEIGHT - 50))
-
-        # Right Flipper Gutter Wall (short inner wall near flipper)
-        self.walls.append(Wall(SCREEN_WIDTH // 2 + 90, SCREEN_HEIGHT - 50, SCREEN_WIDTH // 2 + 130, SCREEN_HEIGHT - 130))
-
-        # --- New Walls and Obstacles ---
-
-        # Central "V" Obstacle (two walls)
-        self.walls.append(Wall(SCREEN_WIDTH // 2 - 60, SCREEN_HEIGHT // 2 - 100, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 50))
-        self.walls.append(Wall(SCREEN_WIDTH // 2 + 60, SCREEN_HEIGHT // 2 - 100, SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 50))
-
-        # Left Bumper Wall
-        self.walls.append(Wall(220, SCREEN_HEIGHT // 2 - 20, 220, SCREEN_HEIGHT // 2 + 60))
-
-        # Right Bumper Wall
-        self.walls.append(Wall(SCREEN_WIDTH - 220, SCREEN_HEIGHT // 2 - 20, SCREEN_WIDTH - 220, SCREEN_HEIGHT // 2 + 60))
-
-        # Angled walls above the flippers
-        self.walls.append(Wall(SCREEN_WIDTH // 2 - 130, SCREEN_HEIGHT - 200, SCREEN_WIDTH // 2 - 200, SCREEN_HEIGHT - 250))
-        self.walls.append(Wall(SCREEN_WIDTH // 2 + 130, SCREEN_HEIGHT - 200, SCREEN_WIDTH // 2 + 200, SCREEN_HEIGHT - 250))
+        self.table = load_table(self.table_path, self.asset_cache)
+        self.wall_grid.build(self.table, WALL_THICKNESS / 2)
 
     def create_collectibles(self):
-        self.collectibles = []
-        
+        # Poolen tømmes og fyldes igen på samme pladser; der oprettes ingen nye objekter
+        self.collectibles.clear()
+
         # Definer et område hvor collectibles kan spawne
         # Juster disse for at styre hvor på banen de kan dukke op
         min_x = 200
@@ -452,32 +1374,52 @@ class PinballGame:
         max_y = SCREEN_HEIGHT - 350 # Undgå flipperområdet
 
         # Tilføj et tilfældigt antal samleobjekter op til COLLECTIBLE_MAX_COUNT
-        num_collectibles_to_add = random.randint(5, COLLECTIBLE_MAX_COUNT)
+        num_collectibles_to_add = self.frenzy or self.rng.randint(5, COLLECTIBLE_MAX_COUNT)
 
         for _ in range(num_collectibles_to_add):
             # Generer tilfældige koordinater inden for det definerede område
-            x = random.randint(min_x, max_x)
-            y = random.randint(min_y, max_y)
-            self.collectibles.append(Collectible(x, y))
+            x = self.rng.randint(min_x, max_x)
+            y = self.rng.randint(min_y, max_y)
+            self.collectibles.spawn(x, y)
 
 
-    def handle_input(self):
+    def read_input(self):
         keys = pygame.key.get_pressed()
+        input_bits = 0
+        if keys[pygame.K_LSHIFT] or keys[pygame.K_LCTRL]:
+            input_bits |= INPUT_LEFT_FLIPPER
+        if keys[pygame.K_RSHIFT] or keys[pygame.K_RCTRL]:
+            input_bits |= INPUT_RIGHT_FLIPPER
+        if keys[pygame.K_r]:
+            input_bits |= INPUT_RESET_BALL
+        return input_bits
+
+    def handle_input(self, input_bits):
+        if input_bits & INPUT_NEW_GAME and self.game_over:
+            self.reset_game()
 
         if not self.game_over:
-            if keys[pygame.K_LSHIFT] or keys[pygame.K_LCTRL]:
+            if input_bits & INPUT_LEFT_FLIPPER:
                 self.left_flipper.activate()
             else:
                 self.left_flipper.deactivate()
 
-            if keys[pygame.K_RSHIFT] or keys[pygame.K_RCTRL]:
+            if input_bits & INPUT_RIGHT_FLIPPER:
                 self.right_flipper.activate()
             else:
                 self.right_flipper.deactivate()
             
-            # Ny logik for at resette bolden, hvis den sidder fast
-            if keys[pygame.K_r] and self.ball.get_speed() < STUCK_THRESHOLD:
-                print("Bolden sidder fast, resetter...")
+            # R erstatter sovende kugler med det samme i stedet for at vente på SLEEP_RESPAWN_AFTER
+            if input_bits & INPUT_RESET_BALL:
+                self._respawn_stuck([ball for ball in self.balls if ball.asleep])
+
+    def _respawn_stuck(self, stuck):
+        # Fastsiddende kugler erstattes af nye uden at koste et liv
+        if stuck:
+            print("Bolden sidder fast, resetter...")
+            self.balls = [ball for ball in self.balls if ball not in stuck]
+            self.stuck_respawns += len(stuck)
+            for _ in stuck:
                 self._spawn_new_ball()
 
 
@@ -485,33 +1427,53 @@ class PinballGame:
         if self.game_over:
             return
 
-        self.ball.update()
-        self.left_flipper.update()
-        self.right_flipper.update()
-
-        for wall in self.walls:
-            wall.check_collision(self.ball, self.sound_manager) # Send sound_manager med
-
-        if self.left_flipper.check_collision(self.ball, self.sound_manager): # Send sound_manager med
-            self.score += 10
-        if self.right_flipper.check_collision(self.ball, self.sound_manager): # Send sound_manager med
-            self.score += 10
+        self.wall_checks = 0
+        self.collectible_checks = 0
+        self.sound_manager.advance(self.step_dt)
+        starts = [(ball.x, ball.y) for ball in self.balls]
+        left_from = self.left_flipper.angle
+        right_from = self.right_flipper.angle
+
+        sleeping = False
+        for ball in self.balls:
+            if ball.asleep:
+                ball.sleep_time += self.step_dt
+                sleeping = True
+            else:
+                ball.update(self.step_dt)
+        self.left_flipper.update(self.step_dt)
+        self.right_flipper.update(self.step_dt)
+        if sleeping:
+            self._wake_balls()
+
+        for ball, (start_x, start_y) in zip(self.balls, starts):
+            if ball.asleep:
+                continue # Sovende kugler springer al kollisionsarbejde over
+            substeps = self._substeps_needed(ball, start_x, start_y, left_from, right_from) if self.continuous_collision else 1
+            if substeps == 1:
+                self._resolve_collisions(ball)
+            else:
+                self._resolve_swept(ball, start_x, start_y, left_from, right_from, substeps)
 
-        # Tjek kollision med samleobjekter
-        collectibles_to_remove = []
-        for collectible in self.collectibles:
-            if collectible.check_collision(self.ball, self.sound_manager): # Send sound_manager med
-                self.score += COLLECTIBLE_POINTS
-                collectibles_to_remove.append(collectible)
-        
-        # Fjern samlede objekter
-        for collectible in collectibles_to_remove:
-            self.collectibles.remove(collectible)
+        if len(self.balls) > 1:
+            self._collide_balls()
+        for ball in self.balls:
+            if not ball.asleep:
+                if self._near_active_flipper(ball):
+                    ball.wake() # En kugle der holdes på en løftet flipper (cradle) sidder ikke fast
+                else:
+                    ball.track_rest(self.step_dt)
 
         # Tjek om alle collectibles er samlet og genopret dem
-        if not self.collectibles: # Hvis listen er tom
+        if not self.collectibles: # Hvis poolen er tom
             print("Alle samleobjekter er samlet! Genopretter nye.")
             self.create_collectibles() # Kalder for at oprette nye
+            if self.multiball_balls:
+                print("Multiball!")
+                self.start_multiball(self.multiball_balls)
+
+        if sleeping:
+            self._respawn_stuck([ball for ball in self.balls if ball.asleep and ball.sleep_time >= SLEEP_RESPAWN_AFTER])
 
         # --- Ny logik for ekstrabold baseret på score ---
         if self.score >= self.last_extra_ball_score_threshold + 500:
@@ -520,102 +1482,484 @@ class PinballGame:
             print(f"Ekstra bold! Antal bolde tilbage: {self.balls_left}")
             # Tilføj evt. en lyd for ekstrabold her
 
-        # Check if ball went out of bounds
-        if self.ball.y > SCREEN_HEIGHT + 50:
-            self.balls_left -= 1
+        # Check if balls went out of bounds. Under multiball koster en tabt kugle
+        # kun et liv når det er den sidste kugle i spil.
+        in_play = [ball for ball in self.balls if ball.y <= SCREEN_HEIGHT + 50]
+        if len(in_play) < len(self.balls):
+            self.balls_lost += len(self.balls) - len(in_play)
+            self.balls = in_play
             self.sound_manager.play_ball_lost() # AFSPIL LYD NÅR BOLDEN TABES
-            if self.balls_left > 0:
-                self._spawn_new_ball()
-            else:
-                self.game_over = True
-                if self.score > self.highscore:
-                    self.highscore = self.score
-                    self.save_highscore()
+            if not self.balls:
+                self.balls_left -= 1
+                if self.balls_left > 0:
+                    self._spawn_new_ball()
+                else:
+                    self.game_over = True
+                    self.save_highscore() # Alle afsluttede spil kommer i leaderboardet
+                    self.highscore = max(self.highscore, self.score)
+
+    def _near_active_flipper(self, ball):
+        # Samme rækkevidde som i _wake_balls
+        for flipper in (self.left_flipper, self.right_flipper):
+            if flipper.is_active:
+                reach = flipper.length + BALL_RADIUS + flipper.width
+                dx = ball.x - flipper.pivot_x
+                dy = ball.y - flipper.pivot_y
+                if dx * dx + dy * dy <= reach * reach:
+                    return True
+        return False
 
-    def draw(self):
-        if self.background_image:
-            self.screen.blit(self.background_image, (0, 0))
+    def _wake_balls(self):
+        # En flipper der har bevæget sig i dette trin vækker sovende kugler inden for rækkevidde.
+        # Kvadreret afstand, så batch_sim.py kan regne præcis det samme
+        for flipper in (self.left_flipper, self.right_flipper):
+            if flipper.angle == flipper.prev_angle:
+                continue
+            reach = flipper.length + BALL_RADIUS + flipper.width
+            for ball in self.balls:
+                if ball.asleep:
+                    dx = ball.x - flipper.pivot_x
+                    dy = ball.y - flipper.pivot_y
+                    if dx * dx + dy * dy <= reach * reach:
+                        ball.wake()
+
+    def _collide_balls(self):
+        # Sweep and prune langs x: listen er næsten sorteret fra sidste frame, så
+        # sorteringen er tæt på lineær, og kun kugler der overlapper på x testes.
+        balls = self.balls
+        balls.sort(key=attrgetter("x"))
+        count = len(balls)
+        for i in range(count):
+            a = balls[i]
+            for j in range(i + 1, count):
+                b = balls[j]
+                dx = b.x - a.x
+                reach = a.radius + b.radius
+                if dx >= reach:
+                    break
+                if a.asleep and b.asleep:
+                    continue # To kugler der sover mod hinanden bliver liggende
+                dy = b.y - a.y
+                dist_sq = dx * dx + dy * dy
+                if dist_sq >= reach * reach or dist_sq == 0:
+                    continue
+                if a.asleep:
+                    a.wake()
+                elif b.asleep:
+                    b.wake()
+
+                # Elastisk stød mellem to lige tunge kugler: normalkomposanterne byttes
+                distance = math.sqrt(dist_sq)
+                nx = dx / distance
+                ny = dy / distance
+                closing = (a.vx - b.vx) * nx + (a.vy - b.vy) * ny
+                if closing > 0:
+                    a.vx -= closing * nx
+                    a.vy -= closing * ny
+                    b.vx += closing * nx
+                    b.vy += closing * ny
+
+                overlap = (reach - distance) / 2
+                a.x -= nx * overlap
+                a.y -= ny * overlap
+                b.x += nx * overlap
+                b.y += ny * overlap
+
+    def _resolve_collisions(self, ball):
+        table = self.table
+        walls = self.wall_grid.query(ball.x - ball.radius, ball.y - ball.radius, ball.x + ball.radius, ball.y + ball.radius)
+        self.wall_checks += len(walls)
+        for index in walls:
+            wall_collision(table, index, ball, self.sound_manager) # Send sound_manager med
+
+        if self.left_flipper.check_collision(ball, self.sound_manager): # Send sound_manager med
+            self.score += 10
+        if self.right_flipper.check_collision(ball, self.sound_manager): # Send sound_manager med
+            self.score += 10
+
+        # Tjek kollision med alle samleobjekter i én gennemgang
+        collected, tested = self.collectibles.collide(ball)
+        self.collectible_checks += tested
+        for slot in collected:
+            self.collectibles.kill(slot)
+            self.score += COLLECTIBLE_POINTS
+            self.sound_manager.play_collectible_pickup(ball.get_speed()) # Afspil collectible lyd
+
+    def _substeps_needed(self, ball, start_x, start_y, left_from, right_from):
+        # Kun hurtige frames deles op; langsomme frames koster ikke ekstra
+        travel = math.hypot(ball.x - start_x, ball.y - start_y)
+        for flipper, from_angle in ((self.left_flipper, left_from), (self.right_flipper, right_from)):
+            swing = abs(flipper.angle - from_angle)
+            if swing == 0:
+                continue
+            # Flipperens bevægelse tæller kun når kuglen er inden for rækkevidde
+            reach = flipper.length + ball.radius + flipper.width + travel
+            if math.hypot(ball.x - flipper.pivot_x, ball.y - flipper.pivot_y) <= reach:
+                travel = max(travel, math.radians(swing) * flipper.length)
+
+        if travel <= SUBSTEP_MAX_TRAVEL:
+            return 1
+        return min(MAX_SUBSTEPS, math.ceil(travel / SUBSTEP_MAX_TRAVEL))
+
+    def _resolve_swept(self, ball, start_x, start_y, left_from, right_from, substeps):
+        # Kuglen spoles tilbage til framets start og flyttes i substeps. I hvert substep
+        # findes første time of impact mod vægge og roterende flippere, kuglen placeres
+        # der, og den almindelige kollisionsrespons køres.
+        flippers = ((self.left_flipper, left_from, self.left_flipper.angle),
+                    (self.right_flipper, right_from, self.right_flipper.angle))
+        step_x = (ball.x - start_x) / substeps
+        step_y = (ball.y - start_y) / substeps
+        ball.x, ball.y = start_x, start_y
+
+        for i in range(substeps):
+            toi = 1.0
+            walls = self.wall_grid.query(min(ball.x, ball.x + step_x) - ball.radius, min(ball.y, ball.y + step_y) - ball.radius,
+                                         max(ball.x, ball.x + step_x) + ball.radius, max(ball.y, ball.y + step_y) + ball.radius)
+            self.wall_checks += len(walls)
+            for index in walls:
+                t = wall_time_of_impact(self.table, index, ball.x, ball.y, step_x, step_y, ball.radius)
+                if t is not None and t < toi:
+                    toi = t
+
+            sub_angles = []
+            for flipper, from_angle, to_angle in flippers:
+                sub_from = from_angle + (to_angle - from_angle) * i / substeps
+                sub_to = from_angle + (to_angle - from_angle) * (i + 1) / substeps
+                flipper.angle = sub_to
+                t = flipper.time_of_impact(ball.x, ball.y, step_x, step_y, ball.radius, sub_from)
+                if t is not None and t < toi:
+                    toi = t
+                sub_angles.append((flipper, sub_from, sub_to))
+
+            ball.x += step_x * toi
+            ball.y += step_y * toi
+            if toi < 1:
+                for flipper, sub_from, sub_to in sub_angles:
+                    flipper.angle = sub_from + (sub_to - sub_from) * toi
+
+            vx, vy = ball.vx, ball.vy
+            self._resolve_collisions(ball)
+            if ball.vx != vx or ball.vy != vy:
+                # Kollisionen ændrede retningen: de resterende substeps (hver step_dt / substeps lang)
+                # følger den nye hastighed
+                step_x = ball.vx * self.step_dt / substeps
+                step_y = ball.vy * self.step_dt / substeps
+
+        for flipper, from_angle, to_angle in flippers:
+            flipper.angle = to_angle
+
+    def set_quality(self, name):
+        # Skifter tegneflade, sprites, fonte, baggrund og lyd til kvalitetsniveauet name
+        scale, background, voices, music, sparkle = QUALITY_LEVELS[name]
+        self.quality = name
+        self.render_scale = scale
+        self.use_background = background
+        if scale == 1.0:
+            self.screen = self.window
+        else:
+            self.screen = pygame.Surface((round(SCREEN_WIDTH * scale), round(SCREEN_HEIGHT * scale))).convert()
+        self.sprites = SpriteCache(scale=scale, sparkle=sparkle)
+        self.font = pygame.font.Font(None, round(36 * scale))
+        self.large_font = pygame.font.Font(None, round(72 * scale)) # Til Game Over skærm
+        self.text_cache.surfaces.clear() # Teksterne fra de gamle fonte bruges ikke mere
+        self.game_over_overlay = pygame.Surface(self.screen.get_size(), pygame.SRCALPHA)
+        self.game_over_overlay.fill((0, 0, 0, 180)) # Sort med 180 alpha
+        self.sound_manager.set_voices(voices)
+        self.sound_manager.set_music_enabled(music)
+        self.build_static_layer()
+
+    def build_static_layer(self):
+        # Baggrund og vægge ændrer sig ikke, så de tegnes én gang til en cachet surface.
+        # Ved en tegneskala under 1 tegnes de i fuld størrelse og skaleres ned
+        layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        if self.background_image and self.use_background:
+            layer.blit(self.background_image, (0, 0))
         else:
-            self.screen.fill(DARK_BLUE)
+            layer.fill(DARK_BLUE)
 
-        for wall in self.walls:
-            wall.draw(self.screen)
+        draw_table_walls(layer, self.table)
+        if self.render_scale != 1.0:
+            layer = pygame.transform.smoothscale(layer, self.screen.get_size())
+        self.static_layer = layer
+        self.full_redraw = True
 
-        for collectible in self.collectibles: # Tegn samleobjekter
-            collectible.draw(self.screen)
+    def draw(self):
+        self.present(self.render())
+
+    def render(self):
+        # Tegner framen og returnerer de områder der skal opdateres på skærmen (None = hele skærmen)
+        if self.screen is not self.window:
+            return self._render_scaled()
+        if self.render_mode == "dirty" and not self.game_over and not self.full_redraw:
+            # Gendan kun de områder der blev tegnet på i sidste frame
+            for rect in self.dirty_rects:
+                self.screen.blit(self.static_layer, rect, rect)
+            rects = self._draw_dynamic()
+            if self.show_profiler and self.profiler:
+                rects.append(self.profiler.draw(self.window))
+            update_rects = self.dirty_rects + rects
+            self.dirty_rects = rects
+            return update_rects
+
+        self.screen.blit(self.static_layer, (0, 0))
+        self.dirty_rects = self._draw_dynamic()
 
-        self.left_flipper.draw(self.screen)
-        self.right_flipper.draw(self.screen)
-        self.ball.draw(self.screen)
+        if self.game_over:
+            self.draw_game_over()
+        if self.show_profiler and self.profiler:
+            self.dirty_rects.append(self.profiler.draw(self.window))
+
+        self.full_redraw = self.game_over # Game over-overlayet dækker hele skærmen
+        return None
+
+    def _render_scaled(self):
+        # Lavere tegneopløsning: framen tegnes på den lille surface, og de ændrede områder (eller
+        # det hele) skaleres op i vinduet. Profileren tegnes direkte i vinduet i fuld størrelse
+        factor = round(1 / self.render_scale)
+        if self.render_mode == "dirty" and not self.game_over and not self.full_redraw:
+            for rect in self.dirty_rects:
+                self.screen.blit(self.static_layer, rect, rect)
+            rects = self._draw_dynamic()
+            bounds = self.screen.get_rect()
+            update_rects = []
+            for rect in self.dirty_rects + rects:
+                rect = rect.clip(bounds)
+                if rect.width and rect.height:
+                    target = pygame.Rect(rect.x * factor, rect.y * factor, rect.width * factor, rect.height * factor)
+                    pygame.transform.scale(self.screen.subsurface(rect), target.size, self.window.subsurface(target))
+                    update_rects.append(target)
+            if self.show_profiler and self.profiler:
+                panel = self.profiler.draw(self.window)
+                update_rects.append(panel)
+                # Panelet fjernes i næste frame ved at skalere området under det op igen
+                rects.append(pygame.Rect(panel.x // factor, panel.y // factor,
+                                         -(-panel.width // factor) + 1, -(-panel.height // factor) + 1))
+            self.dirty_rects = rects
+            return update_rects
+
+        self.screen.blit(self.static_layer, (0, 0))
+        self.dirty_rects = self._draw_dynamic()
+        if self.game_over:
+            self.draw_game_over()
+        pygame.transform.scale(self.screen, self.window.get_size(), self.window)
+        if self.show_profiler and self.profiler:
+            panel = self.profiler.draw(self.window)
+            self.dirty_rects.append(pygame.Rect(panel.x // factor, panel.y // factor,
+                                                -(-panel.width // factor) + 1, -(-panel.height // factor) + 1))
+        self.full_redraw = self.game_over
+        return None
+
+    def present(self, rects):
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
 
-        score_text = self.font.render(f"Score: {self.score}", True, WHITE)
-        self.screen.blit(score_text, (10, 10))
+    def _draw_dynamic(self):
+        # Tegner alt der kan flytte sig eller ændre sig og returnerer de berørte rektangler
+        # Alt samles i én liste af (sprite, position) og tegnes med ét Surface.blits-kald
+        sprites = self.sprites
+        batch = self.collectibles.blit_items(sprites.collectible, self.render_scale) # Tegn samleobjekter
 
-        balls_text = self.font.render(f"Kugler: {self.balls_left}", True, WHITE)
-        self.screen.blit(balls_text, (SCREEN_WIDTH - balls_text.get_width() - 10, 10))
+        alpha = 1.0 if self.game_over else self.alpha # Efter game over står alt stille på sidste trin
+        batch.append(sprites.flipper_item(self.left_flipper, alpha))
+        batch.append(sprites.flipper_item(self.right_flipper, alpha))
+        for ball in self.balls:
+            batch.append(sprites.ball_item(ball, alpha))
 
-        highscore_text = self.font.render(f"Highscore: {self.highscore}", True, WHITE)
-        self.screen.blit(highscore_text, (10, 50))
+        # Tekstpositionerne er angivet i fuld skala
+        scale = self.render_scale
+        width, height = self.screen.get_size()
+        margin = round(10 * scale)
+        score_text = self.text_cache.render(self.font, f"Score: {self.score}", WHITE)
+        batch.append((score_text, (margin, margin)))
 
-        # Vis instruktion for reset
-        if self.ball.get_speed() < STUCK_THRESHOLD and not self.game_over:
-            reset_instruction_text = self.font.render("Bold sidder fast? Tryk 'R' for reset", True, YELLOW)
-            self.screen.blit(reset_instruction_text, (SCREEN_WIDTH // 2 - reset_instruction_text.get_width() // 2, SCREEN_HEIGHT - 20))
+        balls_text = self.text_cache.render(self.font, f"Kugler: {self.balls_left}", WHITE)
+        batch.append((balls_text, (width - balls_text.get_width() - margin, margin)))
 
+        highscore_text = self.text_cache.render(self.font, f"Highscore: {self.highscore}", WHITE)
+        batch.append((highscore_text, (margin, round(50 * scale))))
 
-        if self.game_over:
-            self.draw_game_over()
+        quality = f"Kvalitet: {self.quality}" + (" (auto)" if self.governor else "")
+        quality_text = self.text_cache.render(self.font, quality, GRAY)
+        batch.append((quality_text, (width - quality_text.get_width() - margin, round(50 * scale))))
 
-        pygame.display.flip()
+        # Vis instruktion for reset
+        if not self.game_over and any(ball.asleep for ball in self.balls):
+            reset_instruction_text = self.text_cache.render(self.font, "Bold sidder fast? Tryk 'R' for reset", YELLOW)
+            batch.append((reset_instruction_text, (width // 2 - reset_instruction_text.get_width() // 2, height - round(20 * scale))))
 
-    def draw_game_over(self):
-        # Semi-transparent overlay
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180)) # Sort med 180 alpha
-        self.screen.blit(overlay, (0, 0))
+        return self.screen.blits(batch)
 
-        game_over_label = self.large_font.render("GAME OVER", True, RED)
-        go_rect = game_over_label.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 100))
+    def draw_game_over(self):
+        # Semi-transparent overlay (bygget af set_quality i tegnefladens størrelse)
+        self.screen.blit(self.game_over_overlay, (0, 0))
+        scale = self.render_scale
+        center_x = self.screen.get_width() // 2
+        center_y = self.screen.get_height() // 2
+
+        game_over_label = self.text_cache.render(self.large_font, "GAME OVER", RED)
+        go_rect = game_over_label.get_rect(center=(center_x, center_y - round(100 * scale)))
         self.screen.blit(game_over_label, go_rect)
 
-        final_score_label = self.font.render(f"Din Score: {self.score}", True, WHITE)
-        fs_rect = final_score_label.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 30))
+        final_score_label = self.text_cache.render(self.font, f"Din Score: {self.score}", WHITE)
+        fs_rect = final_score_label.get_rect(center=(center_x, center_y - round(30 * scale)))
         self.screen.blit(final_score_label, fs_rect)
 
-        current_highscore_label = self.font.render(f"Highscore: {self.highscore}", True, WHITE)
-        ch_rect = current_highscore_label.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 10))
+        current_highscore_label = self.text_cache.render(self.font, f"Highscore: {self.highscore}", WHITE)
+        ch_rect = current_highscore_label.get_rect(center=(center_x, center_y + round(10 * scale)))
         self.screen.blit(current_highscore_label, ch_rect)
 
         if self.score == self.highscore and self.highscore > 0: # Kun vis "New Highscore!" hvis det er en ny highscore
-            new_highscore_label = self.font.render("NY HIGH SCORE!", True, YELLOW)
-            nh_rect = new_highscore_label.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 50))
+            new_highscore_label = self.text_cache.render(self.font, "NY HIGH SCORE!", YELLOW)
+            nh_rect = new_highscore_label.get_rect(center=(center_x, center_y + round(50 * scale)))
             self.screen.blit(new_highscore_label, nh_rect)
 
-        try_again_label = self.font.render("Tryk SPACE for at spille igen", True, WHITE)
-        ta_rect = try_again_label.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 120))
+        try_again_label = self.text_cache.render(self.font, "Tryk SPACE for at spille igen", WHITE)
+        ta_rect = try_again_label.get_rect(center=(center_x, center_y + round(120 * scale)))
         self.screen.blit(try_again_label, ta_rect)
 
     def run(self):
+        if self.headless:
+            raise RuntimeError("et headless spil har intet vindue; kald handle_input() og update() direkte")
         running = True
+        self.load_assets()
+
+        # Fast trin med akkumulator: den forløbne tid omsættes til et helt antal
+        # fysiktrin, og resten bruges til at interpolere tegningen
+        step = 1.0 / self.physics_hz
+        accumulator = 0.0
+        previous = time.perf_counter()
+        new_game = False
 
         while running:
+            frame_start = time.perf_counter()
+            self.install_assets()
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_SPACE:
-                        if self.game_over:
-                            self.reset_game()
+                        new_game = new_game or self.game_over # Gælder indtil et fysiktrin har set det
                         # Removed the reset_game() call here for in-game reset
                         # as it's now handled by losing balls.
+                    elif event.key == pygame.K_F3:
+                        if self.profiler is None:
+                            self.profiler = FrameProfiler()
+                        self.show_profiler = not self.show_profiler
+
+            input_bits = self.read_input()
+            profiler = self.profiler
+            if profiler:
+                profiler.lap(PHASE_INPUT)
+
+            now = time.perf_counter()
+            accumulator += now - previous
+            previous = now
+            steps = 0
+            while accumulator >= step:
+                if steps == self.max_catchup:
+                    # Maskinen kan ikke følge med: efterslæbet droppes, så spillet går
+                    # langsommere i stedet for at bruge stadig flere trin pr. frame
+                    accumulator %= step
+                    break
+                if new_game:
+                    input_bits |= INPUT_NEW_GAME
+                    new_game = False
+                if self.recorder:
+                    self.recorder.record(input_bits) # Input optages pr. fysiktrin
+                self.handle_input(input_bits)
+                self.update()
+                input_bits &= ~INPUT_NEW_GAME
+
+                if self.narrowphase_log:
+                    self.narrowphase_log.write(f"{self.frame_count},{self.wall_checks},{self.collectible_checks}\n")
+                self.frame_count += 1
+                accumulator -= step
+                steps += 1
+            self.alpha = accumulator / step
+
+            self.sound_manager.dispatch()
+            if profiler:
+                profiler.lap(PHASE_UPDATE)
+            rects = self.render()
+            if self.capture:
+                self.capture.grab(self.window)
+            if profiler:
+                profiler.lap(PHASE_DRAW)
+            if self.governor:
+                # Flip og ventetid tæller ikke med: med vsync ville flip ellers altid fylde hele budgettet
+                level = self.governor.frame((time.perf_counter() - frame_start) * 1000.0)
+                if level is not None:
+                    name = list(QUALITY_LEVELS)[level]
+                    print(f"Kvalitet: {name} (arbejdstid {self.governor.average_ms:.1f} ms pr. frame)")
+                    self.set_quality(name)
+                    rects = None # Hele vinduet skal opdateres efter skiftet
+            self.present(rects)
+            if profiler:
+                profiler.lap(PHASE_FLIP)
+            self.clock.tick(self.fps)
+            if profiler:
+                profiler.lap(PHASE_TICK)
+                profiler.end_frame()
+
+        if self.narrowphase_log:
+            self.narrowphase_log.close()
+        if self.recorder:
+            self.recorder.save(self.record_path, self.score)
+            print(f"Optagelse gemt i {self.record_path}")
+        self.leaderboard.close()
+        if self.capture:
+            self.capture.close()
+            print(f"Video gemt i {self.capture.path}: {self.capture.written} frames, {self.capture.dropped} droppet")
+        if self.profiler and self.profile_csv:
+            self.profiler.export_csv(self.profile_csv)
+            print(f"Frametid-histogrammer gemt i {self.profile_csv}")
+        pygame.quit()
 
-            self.handle_input()
-            self.update()
-            self.draw()
-            self.clock.tick(FPS)
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pinball Simulator")
+    parser.add_argument("--dump-narrowphase", metavar="FIL", help="skriv antal narrow-phase tests pr. fysiktrin til en CSV-fil")
+    parser.add_argument("--render-mode", choices=("full", "dirty"), default="full",
+                        help="'dirty' gendanner og opdaterer kun de områder der ændrer sig (hurtigere på Raspberry Pi)")
+    parser.add_argument("--seed", type=int, help="seed til spillets tilfældighed (standard: tilfældigt)")
+    parser.add_argument("--record", metavar="FIL", help="optag seed og input til FIL (afspil med: python recording.py FIL)")
+    parser.add_argument("--multiball", type=int, default=1, metavar="N", help="antal kugler i spil fra start")
+    parser.add_argument("--asset-cache", metavar="MAPPE", default=ASSET_CACHE_DIR,
+                        help=f"cache til skaleret baggrund og dekodede lyde (standard: {ASSET_CACHE_DIR}, '' slår den fra)")
+    parser.add_argument("--table", default=DEFAULT_TABLE, metavar="FIL", help="bordfil (.json eller kompileret .pbtable)")
+    parser.add_argument("--frenzy", type=int, metavar="N", help="bonus frenzy: N samleobjekter på bordet ad gangen")
+    parser.add_argument("--profile", action="store_true", help="mål tiden for hver fase i frame-løkken og vis overlayet (F3)")
+    parser.add_argument("--profile-csv", metavar="FIL", help="skriv frametid-histogrammer pr. fase til en CSV-fil ved afslutning")
+    parser.add_argument("--physics-hz", type=int, default=PHYSICS_HZ, metavar="HZ",
+                        help=f"fast trinrate for fysikken (standard: {PHYSICS_HZ}; f.eks. 240 for finere kollisioner)")
+    parser.add_argument("--fps", type=int, default=FPS, metavar="N", help=f"loft over tegnede frames pr. sekund (standard: {FPS}, 0: ubegrænset)")
+    parser.add_argument("--vsync", action="store_true", help="vent på skærmens opdatering ved hver frame")
+    parser.add_argument("--max-catchup", type=int, default=MAX_CATCHUP_STEPS, metavar="N",
+                        help=f"højst N fysiktrin pr. tegnet frame før efterslæbet droppes (standard: {MAX_CATCHUP_STEPS})")
+    parser.add_argument("--capture", metavar="FIL",
+                        help="optag video: FIL.raw giver rå frames, ellers en komprimeret .pbvid (pak ud med capture.py)")
+    parser.add_argument("--quality", choices=("auto",) + tuple(QUALITY_LEVELS), default="auto",
+                        help="fast kvalitetsniveau; 'auto' skruer ned og op efter frametiden (standard)")
+    args = parser.parse_args()
+    if args.physics_hz <= 0 or args.fps < 0 or args.max_catchup <= 0:
+        parser.error("--physics-hz og --max-catchup skal være positive, --fps må ikke være negativ")
+    # Optagelsen gemmer seed'et som u64, trinraten og antal kugler som u16 og frenzy som u32
+    if args.seed is not None and not 0 <= args.seed < 2**64:
+        parser.error("--seed skal ligge mellem 0 og 2**64-1")
+    if args.record and (args.physics_hz > 0xFFFF or not 0 <= args.multiball <= 0xFFFF
+                        or (args.frenzy is not None and not 0 <= args.frenzy < 2**32)):
+        parser.error("--record kræver --physics-hz og --multiball under 65536 og --frenzy under 2**32")
+
+    game = PinballGame(narrowphase_log=args.dump_narrowphase, render_mode=args.render_mode,
+                       seed=args.seed, record_path=args.record, start_balls=args.multiball,
+                       profile=args.profile, profile_csv=args.profile_csv, asset_cache=args.asset_cache, table=args.table,
+                       frenzy=args.frenzy, physics_hz=args.physics_hz, fps=args.fps, vsync=args.vsync,
+                       max_catchup=args.max_catchup, capture=args.capture, quality=args.quality)
+    game.run()
 
-        pygame.quit()
 
 if __name__ == "__main__":
-    game = PinballGame()
-    game.run()
\ No newline at end of file
+    main()
@@ -0,0 +1,188 @@
+"""Vektoriseret reinforcement learning-miljø oven på BatchSimulator.
+
+PinballVecEnv kører mange borde på én gang i Gym-stil:
+
+    env = PinballVecEnv(1024, seed=0)
+    obs = env.reset()
+    obs, reward, done, info = env.step(actions)   # actions: (N, 2) bool eller (N,) input-bits
+
+Observationerne er NumPy-arrays for alle borde (kuglens position og hastighed,
+flippervinkler, maske over levende samleobjekter), belønningen er
+scoreændringen siden sidste skridt, og done markerer spil der er slut (game
+over) eller har nået max_steps. Borde der er færdige startes automatisk forfra
+med et nyt seed; slutscoren står i info["final_score"].
+
+Fysikken er BatchSimulator, dvs. PinballGame med continuous_collision = False
+og multiball_balls = 0. Der tegnes intet, medmindre render() kaldes.
+
+    python pinball_env.py --envs 4096 --steps 2000   # mål skridt/s
+"""
+import random
+import time
+
+import numpy as np
+
+import pinball
+from batch_sim import BatchSimulator
+from pinball import COLLECTIBLE_MAX_COUNT, INPUT_LEFT_FLIPPER, INPUT_RIGHT_FLIPPER, SCREEN_HEIGHT, SCREEN_WIDTH
+
+
+class PinballVecEnv:
+    def __init__(self, num_envs, seed=None, table=pinball.DEFAULT_TABLE, frame_skip=1, max_steps=None,
+                 lost_ball_penalty=0.0):
+        self.num_envs = num_envs
+        self.frame_skip = frame_skip # Frames pr. skridt med samme handling; belønningen summeres
+        self.max_steps = max_steps # Skridt før et spil afbrydes (truncated); None: kun game over
+        self.lost_ball_penalty = lost_ball_penalty
+        self.table = table
+        self._next_seed = seed if seed is not None else random.randrange(2**63)
+        self.sim = BatchSimulator(num_envs, self._take_seeds(range(num_envs)), table)
+
+        n = num_envs
+        self.episode_steps = np.zeros(n, dtype=np.int64)
+        self._last_score = np.zeros(n, dtype=np.int64)
+        # Observationerne skrives i de samme buffere hvert skridt; kopiér dem hvis de skal gemmes
+        self._obs = {
+            "ball": np.zeros((n, 4), dtype=np.float32), # x, y, vx, vy
+            "flippers": np.zeros((n, 2), dtype=np.float32), # vinkel i radianer, venstre og højre
+            "collectibles": np.zeros((n, COLLECTIBLE_MAX_COUNT), dtype=bool),
+            "balls_left": np.zeros(n, dtype=np.int64),
+        }
+        self._renderer = None
+
+    def _take_seeds(self, indices):
+        # Hvert nyt spil får sit eget seed, så en træning kan gentages fra seed'et i konstruktøren
+        seeds = {}
+        for i in indices:
+            seeds[i] = self._next_seed
+            self._next_seed += 1
+        return seeds
+
+    def _observe(self):
+        sim = self.sim
+        obs = self._obs
+        ball = obs["ball"]
+        ball[:, 0] = sim.ball_x
+        ball[:, 1] = sim.ball_y
+        ball[:, 2] = sim.ball_vx
+        ball[:, 3] = sim.ball_vy
+        np.radians(sim.flipper_angle, out=obs["flippers"], casting="same_kind")
+        obs["collectibles"][:] = sim.collectible_alive
+        obs["balls_left"][:] = sim.balls_left
+        return obs
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self._next_seed = seed
+        self.sim.reset(self._take_seeds(range(self.num_envs)))
+        self.episode_steps[:] = 0
+        self._last_score[:] = 0
+        return self._observe()
+
+    def step(self, actions):
+        # actions: (N, 2) med venstre/højre flipper, eller (N,) med INPUT_LEFT_FLIPPER/INPUT_RIGHT_FLIPPER-bits
+        actions = np.asarray(actions)
+        if actions.ndim == 1:
+            left = (actions & INPUT_LEFT_FLIPPER) != 0
+            right = (actions & INPUT_RIGHT_FLIPPER) != 0
+        else:
+            left = actions[:, 0].astype(bool)
+            right = actions[:, 1].astype(bool)
+
+        sim = self.sim
+        balls_lost = sim.balls_lost.copy()
+        for _ in range(self.frame_skip):
+            sim.step(left, right)
+        self.episode_steps += 1
+
+        reward = (sim.score - self._last_score).astype(np.float32)
+        self._last_score[:] = sim.score
+        lost = sim.balls_lost - balls_lost
+        if self.lost_ball_penalty:
+            reward -= self.lost_ball_penalty * lost
+
+        terminated = sim.game_over.copy()
+        truncated = ~terminated & (self.episode_steps >= self.max_steps) if self.max_steps else np.zeros_like(terminated)
+        done = terminated | truncated
+        info = {"balls_lost": lost, "truncated": truncated}
+
+        finished = np.flatnonzero(done)
+        if finished.size:
+            info["final_score"] = np.where(done, sim.score, 0)
+            sim.reset(self._take_seeds(finished), finished)
+            self.episode_steps[finished] = 0
+            self._last_score[finished] = 0
+        return self._observe(), reward, done, info
+
+    def render(self, index=0):
+        # Tegner bord nummer index offscreen og returnerer et (højde, bredde, 3) uint8-array
+        if self._renderer is None:
+            self._renderer = _Renderer(self.table)
+        return self._renderer.draw(self.sim, index)
+
+    def close(self):
+        self._renderer = None
+
+
+class _Renderer:
+    # Genbruger spillets egne tegnerutiner; pygame importeres først her og initialiserer
+    # hverken vindue eller lyd
+    def __init__(self, table):
+        pinball.init_pygame(devices=False)
+        pygame = pinball.pygame
+        self.surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.static_layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.static_layer.fill(pinball.DARK_BLUE)
+        for wall in pinball.create_table_walls(table):
+            wall.draw(self.static_layer)
+        self.flippers = [pinball.Flipper(SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT - 120, True),
+                         pinball.Flipper(SCREEN_WIDTH // 2 + 100, SCREEN_HEIGHT - 120, False)]
+        self.ball = pinball.Ball(0, 0)
+        self.collectibles = pinball.CollectiblePool(COLLECTIBLE_MAX_COUNT)
+
+    def draw(self, sim, index):
+        surface = self.surface
+        surface.blit(self.static_layer, (0, 0))
+
+        self.collectibles.clear()
+        for k in np.flatnonzero(sim.collectible_alive[index]):
+            self.collectibles.spawn(sim.collectible_x[index, k], sim.collectible_y[index, k])
+        self.collectibles.draw(surface)
+        for side, flipper in enumerate(self.flippers):
+            flipper.angle = flipper.prev_angle = float(sim.flipper_angle[index, side])
+            flipper.draw(surface)
+        ball = self.ball
+        ball.x = ball.prev_x = float(sim.ball_x[index])
+        ball.y = ball.prev_y = float(sim.ball_y[index])
+        ball.draw(surface)
+        return pinball.pygame.surfarray.array3d(surface).swapaxes(0, 1)
+
+
+def benchmark(num_envs, steps, seed=0, frame_skip=1):
+    env = PinballVecEnv(num_envs, seed=seed, frame_skip=frame_skip)
+    env.reset()
+    rng = np.random.default_rng(seed)
+    actions = rng.random((min(steps, 256), num_envs, 2)) < 0.1
+    episodes = 0
+    total_reward = 0.0
+    start = time.perf_counter()
+    for step in range(steps):
+        _, reward, done, _ = env.step(actions[step % len(actions)])
+        episodes += int(done.sum())
+        total_reward += float(reward.sum())
+    elapsed = time.perf_counter() - start
+    total = num_envs * steps
+    print(f"{num_envs} miljøer x {steps} skridt på {elapsed:.2f}s: {total / elapsed:,.0f} skridt/s")
+    print(f"Afsluttede spil: {episodes}, samlet belønning: {total_reward:,.0f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mål gennemløbet af det vektoriserede pinball-miljø")
+    parser.add_argument("--envs", type=int, default=4096)
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--frame-skip", type=int, default=1, help="frames pr. skridt med samme handling")
+    args = parser.parse_args()
+    benchmark(args.envs, args.steps, args.seed, args.frame_skip)
@@ -0,0 +1,157 @@
+"""Optagelse og afspilning af pinball-sessioner.
+
+En optagelse består af seed'et til spillets tilfældighedsgenerator, fysikkens
+trinrate, antal kugler ved start, bonus frenzy, bordet og input pr. fysiktrin (flippere, reset af kugle, nyt spil) som en
+run-length-kodet strøm:
+
+    magic "PBREC", version (u8), seed (u64), trin (u32), slutscore (i64),
+    antal runs (u32), trinrate i Hz (u16), kugler ved start (u16),
+    samleobjekter i frenzy (u32, 0: normalt spil), bordets fingeraftryk (8 bytes, se table.table_digest),
+    længde af bordets sti (u16), stien (utf-8), derefter pr. run: input-bits (u8) + længde (varint)
+
+Kør en optagelse igen headless og så hurtigt som CPU'en kan:
+    python recording.py session.pbrec
+
+Afspilningen bruger bordet fra optagelsens sti (eller --table) og afviser det,
+hvis geometrien ikke har samme fingeraftryk som da sessionen blev optaget.
+"""
+import struct
+import time
+
+RECORDING_MAGIC = b"PBREC"
+RECORDING_VERSION = 11
+_HEADER = struct.Struct("<5sBQIqIHHI8sH")
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class InputRecorder:
+    def __init__(self, seed, physics_hz=60, start_balls=1, frenzy=None, table="", table_digest=bytes(8)):
+        self.seed = seed
+        self.physics_hz = physics_hz # Afspilningen skal køre med samme trinrate
+        self.start_balls = start_balls # ... og med samme antal kugler fra start (--multiball)
+        self.frenzy = frenzy # ... og samme bonus frenzy (None: normalt spil)
+        self.table = table # ... og på samme bord
+        self.table_digest = table_digest
+        self.runs = [] # [input-bits, antal trin]
+        self.frames = 0
+
+    def record(self, input_bits):
+        if self.runs and self.runs[-1][0] == input_bits:
+            self.runs[-1][1] += 1
+        else:
+            self.runs.append([input_bits, 1])
+        self.frames += 1
+
+    def save(self, path, final_score):
+        body = bytearray()
+        for input_bits, length in self.runs:
+            body.append(input_bits)
+            _write_varint(body, length)
+        table = self.table.encode("utf-8")
+        # Pakkes før filen åbnes, så et felt uden for sit interval ikke efterlader en tom fil
+        header = _HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, self.seed, self.frames, final_score, len(self.runs),
+                              self.physics_hz, self.start_balls, self.frenzy or 0, self.table_digest, len(table))
+        with open(path, "wb") as f:
+            f.write(header)
+            f.write(table)
+            f.write(body)
+
+
+class Recording:
+    def __init__(self, seed, frames, final_score, runs, physics_hz=60, start_balls=1, frenzy=None,
+                 table="", table_digest=bytes(8)):
+        self.seed = seed
+        self.physics_hz = physics_hz
+        self.start_balls = start_balls
+        self.frenzy = frenzy
+        self.table = table
+        self.table_digest = table_digest
+        self.frames = frames
+        self.final_score = final_score
+        self.runs = runs
+
+    def inputs(self):
+        for input_bits, length in self.runs:
+            for _ in range(length):
+                yield input_bits
+
+
+def load_recording(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, seed, frames, final_score, run_count, physics_hz, start_balls, frenzy, table_digest, table_length = _HEADER.unpack_from(data)
+    if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+        raise ValueError(f"{path} er ikke en pinball-optagelse (version {RECORDING_VERSION})")
+
+    pos = _HEADER.size
+    table = data[pos:pos + table_length].decode("utf-8")
+    pos += table_length
+    runs = []
+    for _ in range(run_count):
+        input_bits = data[pos]
+        length, pos = _read_varint(data, pos + 1)
+        runs.append((input_bits, length))
+    return Recording(seed, frames, final_score, runs, physics_hz, start_balls, frenzy or None, table, table_digest)
+
+
+def replay(recording, game):
+    # Kører optagelsen igennem uden tegning og uden clock.tick
+    for input_bits in recording.inputs():
+        game.handle_input(input_bits)
+        game.update()
+    return game.score
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Afspil en pinball-optagelse headless")
+    parser.add_argument("path", help="optagelse lavet med pinball.py --record")
+    parser.add_argument("--table", help="bordfil, hvis den er flyttet siden optagelsen (standard: stien i optagelsen)")
+    args = parser.parse_args()
+
+    import pinball
+
+    from table import table_digest
+
+    recording = load_recording(args.path)
+    table = args.table or recording.table
+    # Headless: hverken vindue, lydkort eller leaderboard
+    try:
+        game = pinball.PinballGame(seed=recording.seed, physics_hz=recording.physics_hz,
+                                   start_balls=recording.start_balls, frenzy=recording.frenzy, table=table, headless=True)
+    except (OSError, ValueError) as e:
+        print(f"FEJL: kan ikke indlæse bordet {table}: {e}")
+        raise SystemExit(1)
+    if table_digest(game.table) != recording.table_digest:
+        print(f"FEJL: bordet {table} er ikke det bord sessionen blev optaget på")
+        raise SystemExit(1)
+
+    start = time.perf_counter()
+    score = replay(recording, game)
+    elapsed = time.perf_counter() - start
+
+    print(f"{recording.frames} trin à 1/{recording.physics_hz}s på {elapsed:.2f}s ({recording.frames / max(elapsed, 1e-9):,.0f} trin/s)")
+    if score == recording.final_score:
+        print(f"OK: slutscore {score} matcher optagelsen")
+    else:
+        print(f"FEJL: slutscore {score}, optagelsen har {recording.final_score}")
+        raise SystemExit(1)
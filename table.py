@@ -0,0 +1,233 @@
+"""Bordfiler: JSON-kilde og kompileret binært format.
+
+Et bord beskrives i JSON som en liste af vægsegmenter:
+
+    {"name": "Cosmic Flipper", "walls": [{"name": "Outer Left Wall", "points": [170, 230, 170, 744]}, ...]}
+
+compile_table laver det om til en .pbtable-fil med én sammenhængende
+float64-array pr. felt (struct of arrays), så kollisionsløkken og
+batch-simulatoren kun læser forudberegnede tal:
+
+    magic "PBTABL", version (u8), antal segmenter (u32), længde af navn (u16), navn (utf-8),
+    udfyldning til 8 bytes, derefter TABLE_FIELDS i rækkefølge, hver med antal * 8 bytes,
+    og til sidst væggenes broadphase-grid: cellestørrelse (f64), margin (f64),
+    første celle cx0, cy0 (i32), antal celler nx, ny (u32), offsets (u32 * (nx * ny + 1))
+    og vægindeks (u32 pr. celleindgang)
+
+Den kompilerede fil memory-mappes ved indlæsning, også griddet, så selv et bord
+med titusindvis af vægge er klar uden at noget skal bygges. En .json-fil
+kompileres automatisk til asset-cachen første gang og genbruges indtil kilden ændres.
+
+    python table.py tables/default.json -o default.pbtable
+"""
+import math
+import mmap
+import struct
+import sys
+from array import array
+
+TABLE_MAGIC = b"PBTABL"
+TABLE_VERSION = 2
+_HEADER = struct.Struct("<6sBIH")
+_GRID_HEADER = struct.Struct("<ddiiII")
+
+# Felter pr. segment: endepunkter, segmentvektor, enhedsretning, 1/længde², enhedsnormal, bounding box
+TABLE_FIELDS = ("x1", "y1", "x2", "y2", "wx", "wy", "dir_x", "dir_y", "inv_length_sq",
+                "normal_x", "normal_y", "min_x", "min_y", "max_x", "max_y")
+
+GRID_CELL_SIZE = 64 # Griddets celler i den kompilerede fil (pinball.BROADPHASE_CELL_SIZE)
+GRID_MARGIN = 4.0 # Bounding boxene udvides med en halv vægtykkelse (pinball.WALL_THICKNESS / 2)
+
+
+def segment_geometry(x1, y1, x2, y2):
+    # Samme rækkefølge som TABLE_FIELDS; bruges både af compileren og af Wall(x1, y1, x2, y2)
+    wx = x2 - x1
+    wy = y2 - y1
+    length_sq = wx * wx + wy * wy
+    length = math.sqrt(length_sq)
+    if length == 0:
+        return (x1, y1, x2, y2, wx, wy, 0.0, 0.0, 0.0, 0.0, 0.0, min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+    return (x1, y1, x2, y2, wx, wy, wx / length, wy / length, 1.0 / length_sq,
+            -wy / length, wx / length, min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+
+def _little_endian(column):
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column
+
+
+def _read_column(view, typecode):
+    # Zero-copy på little-endian; ellers en byteswappet kopi
+    if sys.byteorder == "little":
+        return view.cast(typecode)
+    column = array(typecode, view.tobytes())
+    column.byteswap()
+    return column
+
+
+class WallGrid:
+    # Uniformt grid over væggene som ét tæt rektangel af celler fra (cx0, cy0).
+    # Celle (cx, cy) er k = (cx - cx0) * ny + (cy - cy0) og indeholder vægindeksene
+    # indices[offsets[k]:offsets[k + 1]] i stigende orden.
+    def __init__(self, cell_size, margin, cx0, cy0, nx, ny, offsets, indices):
+        self.cell_size = cell_size
+        self.margin = margin
+        self.cx0 = cx0
+        self.cy0 = cy0
+        self.nx = nx
+        self.ny = ny
+        self.offsets = offsets
+        self.indices = indices
+
+    def to_bytes(self):
+        return (_GRID_HEADER.pack(self.cell_size, self.margin, self.cx0, self.cy0, self.nx, self.ny)
+                + _little_endian(array("I", self.offsets)).tobytes() + _little_endian(array("I", self.indices)).tobytes())
+
+
+def build_grid(min_x, min_y, max_x, max_y, cell_size=GRID_CELL_SIZE, margin=GRID_MARGIN):
+    # Hver væg lægges i alle celler dens bounding box (udvidet med margin) dækker
+    cells = {}
+    for index, (x0, y0, x1, y1) in enumerate(zip(min_x, min_y, max_x, max_y)):
+        cy_range = range(int((y0 - margin) // cell_size), int((y1 + margin) // cell_size) + 1)
+        for cx in range(int((x0 - margin) // cell_size), int((x1 + margin) // cell_size) + 1):
+            for cy in cy_range:
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    cells[(cx, cy)] = [index]
+                else:
+                    cell.append(index)
+    if not cells:
+        return WallGrid(cell_size, margin, 0, 0, 0, 0, array("I", [0]), array("I"))
+
+    cx0 = min(cx for cx, _ in cells)
+    cy0 = min(cy for _, cy in cells)
+    nx = max(cx for cx, _ in cells) - cx0 + 1
+    ny = max(cy for _, cy in cells) - cy0 + 1
+    offsets = array("I", [0])
+    indices = array("I")
+    for cx in range(cx0, cx0 + nx):
+        for cy in range(cy0, cy0 + ny):
+            indices.extend(cells.get((cx, cy), ()))
+            offsets.append(len(indices))
+    return WallGrid(cell_size, margin, cx0, cy0, nx, ny, offsets, indices)
+
+
+def compile_table_data(source):
+    name = source.get("name", "")
+    segments = []
+    for index, wall in enumerate(source["walls"]):
+        points = wall["points"]
+        if len(points) != 4:
+            raise ValueError(f"væg {index} skal have fire koordinater, ikke {len(points)}")
+        x1, y1, x2, y2 = (float(value) for value in points)
+        if x1 == x2 and y1 == y2:
+            raise ValueError(f"væg {index} ({wall.get('name', 'uden navn')}) har længden 0")
+        segments.append(segment_geometry(x1, y1, x2, y2))
+
+    encoded_name = name.encode("utf-8")
+    out = bytearray(_HEADER.pack(TABLE_MAGIC, TABLE_VERSION, len(segments), len(encoded_name)))
+    out += encoded_name
+    out += bytes(-len(out) % 8) # Arrays starter på en 8-byte grænse
+    columns = {}
+    for field_index, field in enumerate(TABLE_FIELDS):
+        columns[field] = array("d", (segment[field_index] for segment in segments))
+        out += _little_endian(array("d", columns[field])).tobytes()
+    out += build_grid(columns["min_x"], columns["min_y"], columns["max_x"], columns["max_y"]).to_bytes()
+    return bytes(out)
+
+
+def _read_source(path):
+    import json # Importeres kun når en kilde faktisk skal kompileres; en cachet fil mmappes bare
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compile_table(source_path, output_path):
+    data = compile_table_data(_read_source(source_path))
+    with open(output_path, "wb") as f:
+        f.write(data)
+
+
+class Table:
+    # Et indlæst bord. Hvert felt i TABLE_FIELDS er en memoryview af float64
+    # direkte over bufferen (normalt en mmap af den kompilerede fil), og grid er
+    # væggenes broadphase (WallGrid) over samme buffer.
+    def __init__(self, buffer, path=None):
+        magic, version, count, name_length = _HEADER.unpack_from(buffer)
+        if magic != TABLE_MAGIC or version != TABLE_VERSION:
+            raise ValueError(f"{path or 'bufferen'} er ikke en kompileret bordfil (version {TABLE_VERSION})")
+        offset = _HEADER.size
+        self.name = bytes(buffer[offset:offset + name_length]).decode("utf-8")
+        offset += name_length
+        offset += -offset % 8
+        if len(buffer) < offset + count * 8 * len(TABLE_FIELDS) + _GRID_HEADER.size:
+            raise ValueError(f"{path or 'bufferen'} er afkortet")
+
+        self.path = path
+        self.count = count
+        self._buffer = buffer # Holder mmap'en åben så længe bordet bruges
+        view = memoryview(buffer)
+        for field in TABLE_FIELDS:
+            setattr(self, field, _read_column(view[offset:offset + count * 8], "d"))
+            offset += count * 8
+
+        cell_size, margin, cx0, cy0, nx, ny = _GRID_HEADER.unpack_from(buffer, offset)
+        offset += _GRID_HEADER.size
+        offsets = _read_column(view[offset:offset + (nx * ny + 1) * 4], "I")
+        offset += (nx * ny + 1) * 4
+        if len(offsets) != nx * ny + 1 or len(buffer) < offset + offsets[-1] * 4:
+            raise ValueError(f"{path or 'bufferen'} er afkortet")
+        indices = _read_column(view[offset:offset + offsets[-1] * 4], "I")
+        self.grid = WallGrid(cell_size, margin, cx0, cy0, nx, ny, offsets, indices)
+
+
+def table_digest(table):
+    # Fingeraftryk af geometrien (alle felter i TABLE_FIELDS), ens for JSON-kilden og den kompilerede fil
+    import hashlib # Kun når en optagelse skal bære bordets fingeraftryk
+    digest = hashlib.sha1()
+    for field in TABLE_FIELDS:
+        digest.update(getattr(table, field))
+    return digest.digest()[:8]
+
+
+def _map_file(path):
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def load_table(path, cache=None):
+    # .pbtable mmappes direkte. .json kompileres til cachen (en assets.AssetCache)
+    # eller, uden cache, i hukommelsen.
+    if not path.endswith(".json"):
+        return Table(_map_file(path), path)
+
+    if cache:
+        params = f"table|{TABLE_VERSION}"
+        compiled_path = cache.path(path, params)
+        try:
+            return Table(_map_file(compiled_path), compiled_path)
+        except (OSError, ValueError):
+            pass # Ikke kompileret endnu, eller en gammel/ødelagt fil
+        data = compile_table_data(_read_source(path))
+        cache.put(path, params, data)
+        try:
+            return Table(_map_file(compiled_path), compiled_path)
+        except OSError:
+            return Table(data, path) # Cachen kunne ikke skrives
+
+    return Table(compile_table_data(_read_source(path)), path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Kompilér en pinball-bordfil (JSON) til det binære .pbtable-format")
+    parser.add_argument("source", help="bordfil i JSON")
+    parser.add_argument("-o", "--output", help="output (standard: samme navn med .pbtable)")
+    args = parser.parse_args()
+
+    output = args.output or args.source.rsplit(".", 1)[0] + ".pbtable"
+    compile_table(args.source, output)
+    table = load_table(output)
+    print(f"{table.name or args.source}: {table.count} vægge skrevet til {output}")
@@ -0,0 +1,165 @@
+"""Monte Carlo-tuning af bordets fysik.
+
+Kører tusindvis af headless PinballGame-sessioner i en procespulje med en
+scriptet flipper-spiller og samler gennemsnitlig kuglelevetid,
+scorefordeling og andelen af kugler der sidder fast for hvert punkt i et
+parametergrid.
+
+Eksempel:
+    python tuner.py --gravity 0.25 0.3 0.35 --restitution 0.7 0.8 --sessions 2000 --output rapport.csv
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pinball
+
+# Parametre der kan sweepes: navn på kommandolinjen -> konstant i pinball
+PARAMETERS = {
+    "gravity": "GRAVITY",
+    "restitution": "WALL_RESTITUTION",
+    "damping": "BALL_DAMPING",
+    "swing": "FLIPPER_SWING",
+    "flipper_restitution": "FLIPPER_RESTITUTION",
+}
+
+CHUNK_SESSIONS = 25 # Sessioner pr. opgave i puljen
+
+_game = None # Én genbrugt PinballGame pr. worker-proces
+
+
+def _init_worker():
+    # Spillets beskeder ("Ekstra bold!" osv.) skal ikke fylde terminalen fra alle workere
+    sys.stdout = open(os.devnull, "w")
+
+
+class ScriptedPolicy:
+    # Slår med en flipper når en kugle er på vej ned i flipperens slagområde og
+    # holder den oppe et par frames. Fastsiddende kugler erstatter spillet selv (stuck_respawns).
+    HOLD_FRAMES = 8
+
+    def __init__(self, game):
+        self.hold = [0, 0]
+        self.game = game
+
+    def __call__(self):
+        game = self.game
+        input_bits = 0
+        for side, (flipper, bit) in enumerate(((game.left_flipper, pinball.INPUT_LEFT_FLIPPER),
+                                               (game.right_flipper, pinball.INPUT_RIGHT_FLIPPER))):
+            if self.hold[side] == 0:
+                for ball in game.balls:
+                    if (ball.vy > 0 and abs(ball.x - flipper.pivot_x) < flipper.length + ball.radius
+                            and flipper.pivot_y - 70 < ball.y < flipper.pivot_y + 20):
+                        self.hold[side] = self.HOLD_FRAMES
+                        break
+            if self.hold[side]:
+                self.hold[side] -= 1
+                input_bits |= bit
+        return input_bits
+
+
+def run_sessions(params, seeds, max_frames):
+    global _game
+    for name, value in params.items():
+        setattr(pinball, PARAMETERS[name], value)
+    if _game is None:
+        # Headless: workerne åbner hverken vindue, lydkort eller leaderboard
+        _game = pinball.PinballGame(headless=True)
+
+    results = []
+    for seed in seeds:
+        _game.reset_game(seed)
+        policy = ScriptedPolicy(_game)
+        frames = 0
+        while not _game.game_over and frames < max_frames:
+            _game.handle_input(policy())
+            _game.update()
+            frames += 1
+        results.append((_game.score, frames, _game.balls_lost, _game.stuck_respawns))
+    return results
+
+
+def summarize(params, results):
+    scores = [r[0] for r in results]
+    frames = sum(r[1] for r in results)
+    balls = sum(r[2] for r in results)
+    stuck = sum(r[3] for r in results)
+    deciles = statistics.quantiles(scores, n=10, method="inclusive") if len(scores) > 1 else [scores[0]] * 9
+    row = dict(params)
+    row.update({
+        "sessions": len(results),
+        "avg_ball_life_frames": frames / balls if balls else float(frames),
+        "score_mean": statistics.fmean(scores),
+        "score_stdev": statistics.pstdev(scores),
+        "score_min": min(scores),
+        "score_p10": deciles[0],
+        "score_p50": deciles[4],
+        "score_p90": deciles[8],
+        "score_max": max(scores),
+        "stuck_rate": stuck / max(balls + stuck, 1),
+    })
+    return row
+
+
+def write_report(rows, path):
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo-tuning af pinball-fysik")
+    parser.add_argument("--gravity", type=float, nargs="+", default=[pinball.GRAVITY])
+    parser.add_argument("--restitution", type=float, nargs="+", default=[pinball.WALL_RESTITUTION])
+    parser.add_argument("--damping", type=float, nargs="+", default=[pinball.BALL_DAMPING])
+    parser.add_argument("--swing", type=float, nargs="+", default=[pinball.FLIPPER_SWING])
+    parser.add_argument("--flipper-restitution", type=float, nargs="+", default=[pinball.FLIPPER_RESTITUTION])
+    parser.add_argument("--sessions", type=int, default=500, help="sessioner pr. parameterkombination")
+    parser.add_argument("--max-frames", type=int, default=60 * 60 * 5, help="maks frames pr. session")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="antal processer (standard: alle kerner)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="tuning.json", help="rapport som .json eller .csv")
+    args = parser.parse_args()
+
+    grid = [dict(zip(PARAMETERS, values))
+            for values in itertools.product(args.gravity, args.restitution, args.damping, args.swing, args.flipper_restitution)]
+    results = [[] for _ in grid]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+        futures = {}
+        for index, params in enumerate(grid):
+            base = args.seed + index * args.sessions
+            for chunk in range(0, args.sessions, CHUNK_SESSIONS):
+                seeds = range(base + chunk, base + min(chunk + CHUNK_SESSIONS, args.sessions))
+                futures[pool.submit(run_sessions, params, list(seeds), args.max_frames)] = index
+        for future in as_completed(futures):
+            results[futures[future]].extend(future.result())
+    elapsed = time.perf_counter() - start
+
+    rows = [summarize(params, result) for params, result in zip(grid, results)]
+    write_report(rows, args.output)
+
+    total_frames = sum(r[1] for result in results for r in result)
+    print(f"{len(grid)} kombinationer x {args.sessions} sessioner på {elapsed:.1f}s med {args.workers} processer "
+          f"({total_frames / elapsed:,.0f} frames/s)")
+    best = max(rows, key=lambda row: row["avg_ball_life_frames"])
+    print("Længst kuglelevetid: " + ", ".join(f"{name}={best[name]}" for name in PARAMETERS)
+          + f" ({best['avg_ball_life_frames']:.0f} frames, gennemsnitsscore {best['score_mean']:.0f})")
+    print(f"Rapport skrevet til {args.output}")
+
+
+if __name__ == "__main__":
+    main()